@@ -1,10 +1,21 @@
-import concurrent.futures
+import argparse
 import logging
 import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, cast
 from urllib.parse import urlparse
 
-import boto3
+from botocore.exceptions import ClientError
+from s3transfer.futures import TransferFuture
+from s3transfer.manager import TransferManager
+from s3transfer.subscribers import BaseSubscriber
+
+from s3_utils import MB, create_transfer
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_s3.type_defs import HeadObjectOutputTypeDef
 
 
 def parse_s3_uri(s3_uri: str) -> tuple[str, str]:
@@ -23,7 +34,7 @@ def parse_s3_uri(s3_uri: str) -> tuple[str, str]:
     return bucket, key
 
 
-def read_pmid_locations(filepath: str) -> list[dict[str, str]]:
+def read_pmid_locations(filepath: str) -> list[dict[str, Any]]:
     """
     Read the PMID locations file and return list of file info dicts
 
@@ -55,64 +66,169 @@ def read_pmid_locations(filepath: str) -> list[dict[str, str]]:
     return file_manifest
 
 
-def download_file(
-    file_info: dict[str, str], bucket_name: str, local_dir: Path
-) -> bool:
+def _head_key(
+    s3_client: "S3Client", bucket_name: str, key: str
+) -> "HeadObjectOutputTypeDef | None":
+    """Return the HEAD response for an object, or None if it is missing"""
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+
+
+def resolve_s3_keys(
+    file_manifest: list[dict[str, Any]],
+    bucket_name: str,
+    s3_client: "S3Client",
+    max_workers: int = 16,
+) -> list[dict[str, Any]]:
     """
-    Download a single file from S3
+    Check every key exists before downloading, in parallel
+
+    Some objects were uploaded with a doubled '/' in their key, so a key
+    that is missing is retried once in that form and file_info['s3_key']
+    updated to whichever exists. The object size is stored in
+    file_info['size'] so the download does not need its own HEAD request.
 
     Args:
-        file_info: Dict containing 's3_key' and 'local_name' for the file
+        file_manifest: List of dicts containing file information
         bucket_name: Name of the S3 bucket
-        local_dir: Local directory to save files
+        s3_client: S3 client used for the HEAD requests
+        max_workers: Number of concurrent HEAD requests
+
+    Returns:
+        The entries of file_manifest whose key was found
     """
-    s3_client = boto3.client("s3")
-    try:
-        local_path = local_dir / file_info["local_name"]
-        local_path.parent.mkdir(parents=True, exist_ok=True)
 
-        s3_client.download_file(
-            Bucket=bucket_name,
-            Key=file_info["s3_key"],
-            Filename=str(local_path),
-        )
-        logging.info(
-            f"Successfully downloaded PMID {file_info['pmid']}"
-            + f" to {file_info['local_name']}"
-        )
-        return True
-    except Exception:
+    def resolve(file_info: dict[str, Any]) -> bool:
+        key = file_info["s3_key"]
         try:
-            # add in a / to the prefix
-            parts = file_info["s3_key"].split("/")
-            amended_key = "//".join(parts)
-            s3_client.download_file(
-                Bucket=bucket_name,
-                Key=amended_key,
-                Filename=str(local_path),
-            )
+            response = _head_key(s3_client, bucket_name, key)
+            if response is None:
+                # add in a / to the prefix
+                key = "//".join(key.split("/"))
+                response = _head_key(s3_client, bucket_name, key)
         except Exception as e:
             logging.error(
-                f"Failed to download PMID {file_info['pmid']}"
+                f"Failed to look up PMID {file_info['pmid']}"
                 + f" ({file_info['s3_key']}): {str(e)}"
             )
-        return False
+            return False
+        if response is None:
+            logging.error(
+                f"PMID {file_info['pmid']} not found"
+                + f" ({file_info['s3_key']})"
+            )
+            return False
+        file_info["s3_key"] = key
+        file_info["size"] = response["ContentLength"]
+        return True
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        found = list(executor.map(resolve, file_manifest))
+
+    resolved = [info for info, ok in zip(file_manifest, found) if ok]
+    logging.info(
+        f"Resolved {len(resolved)} of {len(file_manifest)} keys in S3"
+    )
+    return resolved
+
+
+def skip_downloaded(
+    file_manifest: list[dict[str, Any]], local_dir: str, verify: bool = False
+) -> list[dict[str, Any]]:
+    """
+    Drop files that have already been downloaded
+
+    Args:
+        file_manifest: List of dicts containing file information
+        local_dir: Local directory files are saved to
+        verify: Only skip a local file if its size matches file_info['size']
+            from resolve_s3_keys, rather than if it is non-empty
+
+    Returns:
+        The entries of file_manifest that still need downloading
+    """
+    local_path = Path(local_dir)
+    remaining = []
+    for file_info in file_manifest:
+        try:
+            size = (local_path / file_info["local_name"]).stat().st_size
+        except FileNotFoundError:
+            remaining.append(file_info)
+            continue
+        if size == 0 or (verify and size != file_info["size"]):
+            remaining.append(file_info)
+
+    skipped = len(file_manifest) - len(remaining)
+    if skipped > 0:
+        logging.info(f"Skipping {skipped} files that were already downloaded")
+    return remaining
+
+
+class _KnownObject(BaseSubscriber):
+    """Give the transfer manager the size it would otherwise HEAD for"""
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+
+    def on_queued(self, future: TransferFuture, **kwargs) -> None:
+        future.meta.provide_transfer_size(self._size)
+
+
+def download_file(
+    file_info: dict[str, Any],
+    bucket_name: str,
+    local_dir: Path,
+    transfer: TransferManager,
+) -> TransferFuture:
+    """
+    Queue a single file download from S3
+
+    Args:
+        file_info: Dict containing 's3_key' and 'local_name' for the file,
+            and optionally its 'size' from resolve_s3_keys
+        bucket_name: Name of the S3 bucket
+        local_dir: Local directory to save files
+        transfer: Shared transfer manager used for the download
+
+    Returns:
+        Future that resolves once the file has been written
+    """
+    local_path = local_dir / file_info["local_name"]
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    subscribers = None
+    if "size" in file_info:
+        subscribers = [_KnownObject(file_info["size"])]
+    return transfer.download(
+        bucket_name,
+        file_info["s3_key"],
+        str(local_path),
+        subscribers=subscribers,
+    )
 
 
 def parallel_download(
-    file_manifest: list[dict[str, str]],
+    file_manifest: list[dict[str, Any]],
     bucket_name: str,
     local_dir: str,
-    max_workers: int = 16,
+    transfer: TransferManager,
 ) -> None:
     """
     Download multiple files in parallel from S3
 
+    Every download is queued on the transfer manager up front; its
+    max_concurrency bounds the number of GETs in flight, so no thread sits
+    blocked waiting on a single file. Transient errors and throttling are
+    retried by the client's adaptive retry mode.
+
     Args:
         file_manifest: List of dicts containing file information
         bucket_name: Name of the S3 bucket
         local_dir: Local directory to save files
-        max_workers: Number of concurrent downloads
+        transfer: Shared transfer manager used for every download
     """
     local_path = Path(local_dir)
     local_path.mkdir(parents=True, exist_ok=True)
@@ -120,30 +236,30 @@ def parallel_download(
     success_count = 0
     failure_count = 0
 
-    with concurrent.futures.ThreadPoolExecutor(
-        max_workers=max_workers
-    ) as executor:
-        # Submit all download tasks
-        future_to_file = {
-            executor.submit(
-                download_file, file_info, bucket_name, local_path
-            ): file_info
-            for file_info in file_manifest
-        }
-
-        # Process completed downloads
-        for future in concurrent.futures.as_completed(future_to_file):
-            file_info = future_to_file[future]
-            try:
-                if future.result():
-                    success_count += 1
-                else:
-                    failure_count += 1
-            except Exception as e:
-                logging.error(
-                    f"Exception downloading {file_info['s3_key']}: {str(e)}"
-                )
-                failure_count += 1
+    # Submit all download tasks
+    futures = [
+        (
+            download_file(file_info, bucket_name, local_path, transfer),
+            file_info,
+        )
+        for file_info in file_manifest
+    ]
+
+    # Process completed downloads
+    for future, file_info in futures:
+        try:
+            future.result()
+            logging.info(
+                f"Successfully downloaded PMID {file_info['pmid']}"
+                + f" to {file_info['local_name']}"
+            )
+            success_count += 1
+        except Exception as e:
+            logging.error(
+                f"Failed to download PMID {file_info['pmid']}"
+                + f" ({file_info['s3_key']}): {str(e)}"
+            )
+            failure_count += 1
 
     logging.info(
         "Download complete. Successes:"
@@ -164,6 +280,40 @@ def get_optimal_worker_count() -> int:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download PDFs listed in found_pmids.txt from S3"
+    )
+    parser.add_argument(
+        "--multipart-threshold",
+        type=int,
+        default=8 * MB,
+        help="Size in bytes above which ranged GETs are used (default: 8 MiB)",
+    )
+    parser.add_argument(
+        "--multipart-chunksize",
+        type=int,
+        default=16 * MB,
+        help="Size in bytes of each ranged GET (default: 16 MiB)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="Maximum concurrent S3 requests (default: based on CPU count)",
+    )
+    parser.add_argument(
+        "--io-chunksize",
+        type=int,
+        default=256 * 1024,
+        help="Size in bytes of each local write (default: 256 KiB)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Re-download existing files whose size differs from S3",
+    )
+    args = parser.parse_args()
+
     # Configure logging
     logging.basicConfig(
         level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
@@ -178,12 +328,34 @@ if __name__ == "__main__":
 
     logging.info(f"Found {len(file_manifest)} files to download")
 
-    max_workers = get_optimal_worker_count()
-    logging.info(f"Using {max_workers} workers based on system CPU count")
+    local_dir = "downloaded_pdfs"
+    max_workers = args.max_concurrency or get_optimal_worker_count()
+    logging.info(f"Using {max_workers} concurrent S3 requests")
 
-    parallel_download(
-        file_manifest=file_manifest[:100],
-        bucket_name=bucket_name,
-        local_dir="downloaded_pdfs",
-        max_workers=max_workers,
-    )
+    with create_transfer(
+        multipart_threshold=args.multipart_threshold,
+        multipart_chunksize=args.multipart_chunksize,
+        max_concurrency=max_workers,
+        io_chunksize=args.io_chunksize,
+    ) as transfer:
+        file_manifest = file_manifest[:100]
+        if not args.verify:
+            # Existing files need no HEAD request when sizes are not checked
+            file_manifest = skip_downloaded(file_manifest, local_dir)
+        file_manifest = resolve_s3_keys(
+            file_manifest,
+            bucket_name,
+            # The transfer's client is sized for max_workers HEAD threads
+            cast("S3Client", transfer.client),
+            max_workers=max_workers,
+        )
+        if args.verify:
+            file_manifest = skip_downloaded(
+                file_manifest, local_dir, verify=True
+            )
+        parallel_download(
+            file_manifest=file_manifest,
+            bucket_name=bucket_name,
+            local_dir=local_dir,
+            transfer=transfer,
+        )
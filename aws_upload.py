@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
 import logging
-from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Set
-
-import boto3
-from botocore.exceptions import ClientError
+from typing import Dict, List, Set
+
+import pandas as pd
+from botocore.exceptions import BotoCoreError, ClientError
+from s3transfer.exceptions import RetriesExceededError
+from s3transfer.futures import TransferFuture
+from s3transfer.manager import TransferManager
+from s3transfer.subscribers import BaseSubscriber
+
+from s3_utils import (
+    MB,
+    create_transfer,
+    get_s3_client,
+    list_keys,
+    read_inventory_keys,
+)
 
 # Set up logging
 logging.basicConfig(
@@ -19,7 +29,11 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def parse_csv_inventory(csv_path: str) -> tuple[List[Path], Set[int]]:
+def parse_csv_inventory(
+    csv_path: str,
+    copy_from_uri_column: str | None = None,
+    s3_inventory: Set[str] | None = None,
+) -> tuple[List[Path], Set[int], Dict[str, str]]:
     """
     Parse CSV inventory file and create a list of unique PDF paths.
 
@@ -27,51 +41,88 @@ def parse_csv_inventory(csv_path: str) -> tuple[List[Path], Set[int]]:
     ----------
     csv_path : str
         Path to the CSV inventory file.
+    copy_from_uri_column : str | None, optional
+        Name of a column holding the S3 URI of a copy of the file that is
+        already in S3, by default None
+    s3_inventory : Set[str] | None, optional
+        Filenames that already exist in S3; these are left out of the
+        upload list, by default None
 
     Returns
     -------
-    tuple[List[Path], Set[int]]
+    tuple[List[Path], Set[int], Dict[str, str]]
         A tuple containing:
-        - List of Path objects for unique PDFs
+        - List of Path objects for unique PDFs not already in S3
         - Set of integers representing processed accession numbers
+        - Dict mapping PDF filenames to the S3 URI they can be copied from
 
     Notes
     -----
-    Skips duplicate accession numbers and logs them.
+    Skips duplicate accession numbers and logs them. Processed accession
+    numbers include files skipped because they are already in S3.
     """
-    upload_list = []
-    processed_accessions = set()
-
+    columns = ["name"]
+    if copy_from_uri_column is not None:
+        columns.append(copy_from_uri_column)
     try:
-        with open(csv_path, "r") as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                pdf_path = Path(row["name"])
-                try:
-                    accession_num = int(pdf_path.stem)
-                    if accession_num in processed_accessions:
-                        logger.warning(
-                            "Duplicate accession number found: "
-                            + f"{accession_num} - {pdf_path}"
-                        )
-                        continue
-
-                    processed_accessions.add(accession_num)
-                    upload_list.append(pdf_path)
-                except ValueError:
-                    logger.error(
-                        f"Invalid accession number format: {pdf_path.stem}"
-                    )
-                    continue
-
+        df = pd.read_csv(csv_path, usecols=columns, dtype=str)
     except Exception as e:
         logger.error(f"Error processing CSV file: {e}")
         raise
 
-    return upload_list, processed_accessions
+    # Accession number is the filename without directory or extension
+    filenames = df["name"].str.rsplit("/", n=1).str[-1]
+    stems = filenames.str.rsplit(".", n=1).str[0]
+    # Accept what int() would: surrounding whitespace and a sign. Stems of
+    # over 18 digits could overflow int64, so are treated as invalid like
+    # any other malformed accession
+    stripped = stems.str.strip()
+    accessions = pd.to_numeric(
+        stripped.where(stripped.str.fullmatch(r"[+-]?\d{1,18}", na=False))
+    ).astype("Int64")
+
+    invalid = accessions.isna()
+    for stem in stems[invalid]:
+        logger.error(f"Invalid accession number format: {stem}")
+
+    duplicated = accessions.duplicated(keep="first") & ~invalid
+    for accession_num, name in zip(
+        accessions[duplicated], df.loc[duplicated, "name"]
+    ):
+        logger.warning(
+            "Duplicate accession number found: "
+            + f"{accession_num} - {Path(name)}"
+        )
+
+    keep = ~(invalid | duplicated)
+    processed_accessions = set(accessions[keep].tolist())
+
+    if s3_inventory is not None:
+        # Drop files already in S3 before any Path objects are built
+        existing = keep & filenames.isin(s3_inventory)
+        skipped = int(existing.sum())
+        if skipped > 0:
+            logger.info(f"Skipping {skipped} files that already exist in S3")
+        keep &= ~existing
+
+    upload_list = [Path(name) for name in df.loc[keep, "name"]]
+
+    copy_sources: Dict[str, str] = {}
+    if copy_from_uri_column is not None:
+        has_source = keep & df[copy_from_uri_column].notna()
+        copy_sources = dict(
+            zip(
+                filenames[has_source],
+                df.loc[has_source, copy_from_uri_column],
+            )
+        )
+
+    return upload_list, processed_accessions, copy_sources
 
 
-def get_s3_inventory(s3_uri: str) -> Set[str]:
+def get_s3_inventory(
+    s3_uri: str, inventory_manifest: str | None = None
+) -> Set[str]:
     """
     Get inventory of existing PDF files in S3 bucket.
 
@@ -79,6 +130,9 @@ def get_s3_inventory(s3_uri: str) -> Set[str]:
     ----------
     s3_uri : str
         S3 URI in format s3://bucket-name/prefix
+    inventory_manifest : str | None, optional
+        S3 URI of an S3 Inventory manifest.json for the bucket. When given
+        it is read instead of listing the bucket.
 
     Returns
     -------
@@ -93,15 +147,29 @@ def get_s3_inventory(s3_uri: str) -> Set[str]:
         bucket_name = s3_uri.split("/")[2]
         prefix = "/".join(s3_uri.split("/")[3:])
 
-        s3_client = boto3.client("s3")
+        s3_client = get_s3_client()
+        # upload_file names every key f"{prefix}/{filename}", so only keys
+        # directly under that are existing uploads
+        key_prefix = f"{prefix}/"
+
+        if inventory_manifest is not None:
+            keys = read_inventory_keys(
+                s3_client, inventory_manifest, bucket_name, key_prefix
+            )
+            keys = keys[keys.str.lower().str.endswith(".pdf")]
+            return set(keys.str.rsplit("/", n=1).str[-1])
+
         existing_files = set()
 
-        paginator = s3_client.get_paginator("list_objects_v2")
-        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
-            if "Contents" in page:
-                for obj in page["Contents"]:
-                    if obj["Key"].lower().endswith(".pdf"):
-                        existing_files.add(Path(obj["Key"]).name)
+        # Uploads are named by accession number, so list each leading digit
+        # in parallel
+        for key in list_keys(
+            s3_client, bucket_name, key_prefix, partitions="0123456789"
+        ):
+            # Only lowercase the extension, and slice the filename off the
+            # key rather than building a Path
+            if key[-4:].lower() == ".pdf":
+                existing_files.add(key[key.rfind("/") + 1 :])
 
         return existing_files
 
@@ -110,38 +178,38 @@ def get_s3_inventory(s3_uri: str) -> Set[str]:
         raise
 
 
-def filter_upload_list(
-    upload_list: List[Path], s3_inventory: Set[str]
-) -> List[Path]:
+UPLOAD_ERRORS = (BotoCoreError, ClientError, RetriesExceededError, OSError)
+
+
+class UploadResultLogger(BaseSubscriber):
     """
-    Remove files that already exist in S3 from upload list.
+    Log the outcome of an upload as soon as it finishes.
 
     Parameters
     ----------
-    upload_list : List[Path]
-        List of Path objects to potentially upload
-    s3_inventory : Set[str]
-        Set of filenames that already exist in S3
-
-    Returns
-    -------
-    List[Path]
-        Filtered list of Path objects to upload
+    file_path : Path
+        Path of the file being uploaded
     """
-    filtered_list = [
-        path for path in upload_list if path.name not in s3_inventory
-    ]
 
-    skipped = len(upload_list) - len(filtered_list)
-    if skipped > 0:
-        logger.info(f"Skipping {skipped} files that already exist in S3")
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
 
-    return filtered_list
+    def on_done(self, future: TransferFuture, **kwargs) -> None:
+        try:
+            future.result()
+            logger.info(f"Successfully uploaded: {self.file_path.name}")
+        except UPLOAD_ERRORS as e:
+            logger.error(f"Error uploading {self.file_path.name}: {e}")
 
 
-def upload_file(file_path: Path, s3_uri: str) -> bool:
+def upload_file(
+    file_path: Path,
+    s3_uri: str,
+    transfer: TransferManager,
+    source_s3_uri: str | None = None,
+) -> TransferFuture:
     """
-    Upload a single file to S3.
+    Queue a single file upload to S3.
 
     Parameters
     ----------
@@ -149,30 +217,50 @@ def upload_file(file_path: Path, s3_uri: str) -> bool:
         Path to file to upload
     s3_uri : str
         S3 URI destination
+    transfer : TransferManager
+        Shared transfer manager used for the upload
+    source_s3_uri : str | None, optional
+        S3 URI of an existing copy of the file. When given, the object is
+        copied server-side and the local file is never read.
 
     Returns
     -------
-    bool
-        True if upload successful, False otherwise
+    TransferFuture
+        Future that resolves once the upload has finished
     """
-    try:
-        bucket_name = s3_uri.split("/")[2]
-        prefix = "/".join(s3_uri.split("/")[3:])
-        s3_key = f"{prefix}/{file_path.name}"
-
-        s3_client = boto3.client("s3")
-        s3_client.upload_file(str(file_path), bucket_name, s3_key)
-        logger.info(f"Successfully uploaded: {file_path.name}")
-        return True
+    bucket_name = s3_uri.split("/")[2]
+    prefix = "/".join(s3_uri.split("/")[3:])
+    s3_key = f"{prefix}/{file_path.name}"
+
+    if source_s3_uri is not None:
+        # S3-to-S3 copy, multipart above multipart_threshold
+        copy_source = {
+            "Bucket": source_s3_uri.split("/")[2],
+            "Key": "/".join(source_s3_uri.split("/")[3:]),
+        }
+        return transfer.copy(
+            copy_source,
+            bucket_name,
+            s3_key,
+            subscribers=[UploadResultLogger(file_path)],
+        )
 
-    except ClientError as e:
-        logger.error(f"Error uploading {file_path.name}: {e}")
-        return False
+    return transfer.upload(
+        str(file_path),
+        bucket_name,
+        s3_key,
+        subscribers=[UploadResultLogger(file_path)],
+    )
 
 
-def parallel_upload(file_list: List[Path], s3_uri: str, num_threads: int):
+def parallel_upload(
+    file_list: List[Path],
+    s3_uri: str,
+    transfer: TransferManager,
+    copy_sources: Dict[str, str] | None = None,
+):
     """
-    Upload files to S3 in parallel using threading.
+    Upload files to S3 in parallel.
 
     Parameters
     ----------
@@ -180,19 +268,36 @@ def parallel_upload(file_list: List[Path], s3_uri: str, num_threads: int):
         List of files to upload
     s3_uri : str
         S3 URI destination
-    num_threads : int
-        Number of upload threads to use
+    transfer : TransferManager
+        Shared transfer manager used for every upload
+    copy_sources : Dict[str, str] | None, optional
+        Mapping of filenames to S3 URIs to copy them from instead of
+        uploading the local file
 
     Notes
     -----
-    Uses ThreadPoolExecutor for parallel uploads
+    Every upload is queued on the transfer manager up front; its
+    max_concurrency bounds the number of PUTs in flight. Each upload is
+    logged as soon as it completes, so a slow file does not hold back
+    reporting of the ones that finish after it.
     """
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        results = list(
-            executor.map(lambda x: upload_file(x, s3_uri), file_list)
+    copy_sources = copy_sources or {}
+    futures = [
+        upload_file(
+            file_path, s3_uri, transfer, copy_sources.get(file_path.name)
         )
+        for file_path in file_list
+    ]
+
+    success_count = 0
+    for future in futures:
+        try:
+            future.result()
+            success_count += 1
+        except UPLOAD_ERRORS:
+            # Already logged by UploadResultLogger
+            pass
 
-    success_count = sum(1 for r in results if r)
     logger.info(
         f"Upload complete. {success_count}/{len(file_list)} "
         + "files uploaded successfully"
@@ -221,22 +326,59 @@ def main():
         default=6,
         help="Number of upload threads (default: 6)",
     )
+    parser.add_argument(
+        "--copy-from-uri-column",
+        default=None,
+        help="Inventory column holding an S3 URI to copy each file from "
+        + "server-side instead of uploading it",
+    )
+    parser.add_argument(
+        "--inventory-manifest",
+        default=None,
+        help="S3 URI of an S3 Inventory manifest.json to read instead of "
+        + "listing the bucket",
+    )
+    parser.add_argument(
+        "--multipart-threshold",
+        type=int,
+        default=8 * MB,
+        help="Size in bytes above which multipart uploads are used "
+        + "(default: 8 MiB)",
+    )
+    parser.add_argument(
+        "--multipart-chunksize",
+        type=int,
+        default=16 * MB,
+        help="Size in bytes of each uploaded part (default: 16 MiB)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=None,
+        help="Maximum concurrent S3 requests (default: number of threads)",
+    )
+    parser.add_argument(
+        "--io-chunksize",
+        type=int,
+        default=256 * 1024,
+        help="Size in bytes of each local read (default: 256 KiB)",
+    )
 
     args = parser.parse_args()
 
     try:
-        # Parse inventory and get unique files
-        logger.info("Parsing CSV inventory...")
-        upload_list, processed_accessions = parse_csv_inventory(args.inventory)
-        logger.info(f"Found {len(upload_list)} unique PDFs to process")
-
         # Get S3 inventory
         logger.info("Getting S3 inventory...")
-        s3_inventory = get_s3_inventory(args.s3_uri)
+        s3_inventory = get_s3_inventory(args.s3_uri, args.inventory_manifest)
         logger.info(f"Found {len(s3_inventory)} existing PDFs in S3")
 
-        # Filter out existing files
-        filtered_list = filter_upload_list(upload_list, s3_inventory)
+        # Parse inventory, dropping duplicates and files already in S3
+        logger.info("Parsing CSV inventory...")
+        filtered_list, processed_accessions, copy_sources = (
+            parse_csv_inventory(
+                args.inventory, args.copy_from_uri_column, s3_inventory
+            )
+        )
         logger.info(f"{len(filtered_list)} files to upload")
 
         # Perform parallel upload
@@ -244,7 +386,15 @@ def main():
             logger.info(
                 f"Starting parallel upload with {args.threads} threads..."
             )
-            parallel_upload(filtered_list, args.s3_uri, args.threads)
+            with create_transfer(
+                multipart_threshold=args.multipart_threshold,
+                multipart_chunksize=args.multipart_chunksize,
+                max_concurrency=args.max_concurrency or args.threads,
+                io_chunksize=args.io_chunksize,
+            ) as transfer:
+                parallel_upload(
+                    filtered_list, args.s3_uri, transfer, copy_sources
+                )
         else:
             logger.info("No files to upload")
 
@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from excel_cache import cached_excel_column
+
 OG_TOTAL_INVENTORY: Path = Path(r"total_pmid_articles.csv")
 OG_2019_2023_INVENTORY: Path = Path(r"All_ICs19_23_noDups_DM.csv")
 ARTICLES_2024: Path = Path(r"pmids_articles_2024.csv")
@@ -27,30 +30,39 @@ assert (
 ), f"{ALL_2019_2023_INVENTORY} not found, please check the path"
 
 
-total_missing_df: pd.DataFrame = pd.read_excel(
-    TOTAL_INVENTORY, sheet_name="Missing"
+# Sorted unique int64 arrays let numpy do the set arithmetic in C
+total_missing_pmids: np.ndarray = np.unique(
+    cached_excel_column(TOTAL_INVENTORY)
 )
-total_missing_pmids: set[int] = set(
-    total_missing_df["Missing PMIDs"].astype(int)
+all_2019_2023_pmids: np.ndarray = np.unique(
+    cached_excel_column(ALL_2019_2023_INVENTORY)
 )
 
-all_2019_2023_df: pd.DataFrame = pd.read_excel(
-    ALL_2019_2023_INVENTORY, sheet_name="Missing"
+articles_2024_df: pd.DataFrame = pd.read_csv(
+    ARTICLES_2024, usecols=["PMID"], dtype={"PMID": "int64"}
 )
-all_2019_2023_pmids: set[int] = set(
-    all_2019_2023_df["Missing PMIDs"].astype(int)
+articles_2024_pmids: np.ndarray = np.unique(
+    articles_2024_df["PMID"].to_numpy(dtype=np.int64)
 )
-
-articles_2024_df: pd.DataFrame = pd.read_csv(ARTICLES_2024)
-articles_2024_pmids: set[int] = set(articles_2024_df["PMID"])
-all_2019_2023_not_in_2024: set[int] = all_2019_2023_pmids - articles_2024_pmids
-all_2019_2023_from_2024: set[int] = all_2019_2023_pmids.intersection(
-    articles_2024_pmids
+# One membership pass per inventory gives both the "in" and "not in" split
+total_missing_in_2024: np.ndarray = np.isin(
+    total_missing_pmids, articles_2024_pmids, assume_unique=True
 )
-total_missing_not_in_2024: set[int] = total_missing_pmids - articles_2024_pmids
-total_missing_from_2024: set[int] = total_missing_pmids.intersection(
-    articles_2024_pmids
+all_2019_2023_in_2024: np.ndarray = np.isin(
+    all_2019_2023_pmids, articles_2024_pmids, assume_unique=True
 )
+all_2019_2023_not_in_2024: np.ndarray = all_2019_2023_pmids[
+    ~all_2019_2023_in_2024
+]
+all_2019_2023_from_2024: np.ndarray = all_2019_2023_pmids[
+    all_2019_2023_in_2024
+]
+total_missing_not_in_2024: np.ndarray = total_missing_pmids[
+    ~total_missing_in_2024
+]
+total_missing_from_2024: np.ndarray = total_missing_pmids[
+    total_missing_in_2024
+]
 print(f"Total unique PMIDs in 2024: {len(articles_2024_pmids)}")
 print(
     f"Missing from 2019-2024 IRP inventory, not in 2024: {len(total_missing_not_in_2024)}"
@@ -65,10 +77,16 @@ print(
     f"Missing from 2019-2023 IRP inventory, in 2024: {len(all_2019_2023_from_2024)}"
 )
 
-og_total: pd.DataFrame = pd.read_csv(OG_TOTAL_INVENTORY)
-og_2019_2023: pd.DataFrame = pd.read_csv(OG_2019_2023_INVENTORY)
-is_subset: bool = set(og_2019_2023["PMID"].astype(int)).issubset(
-    set(og_total["PMID"].astype(int))
+og_total: pd.DataFrame = pd.read_csv(
+    OG_TOTAL_INVENTORY, usecols=["PMID"], dtype={"PMID": "int64"}
+)
+og_2019_2023: pd.DataFrame = pd.read_csv(
+    OG_2019_2023_INVENTORY, usecols=["PMID"], dtype={"PMID": "int64"}
+)
+is_subset: bool = (
+    pd.Index(og_2019_2023["PMID"].to_numpy(dtype=np.int64))
+    .difference(pd.Index(og_total["PMID"].to_numpy(dtype=np.int64)))
+    .empty
 )
 print(
     f"Is the 2019-2023 inventory a subset of the total inventory? {is_subset}"
@@ -6,7 +6,7 @@ import json
 import os
 from pathlib import Path
 import unicodedata
-from typing import Dict, Set, Tuple
+from typing import Dict, Iterator, Set, Tuple
 
 
 def load_json_data(
@@ -24,7 +24,10 @@ def load_json_data(
         if entry.get("attachments") and len(entry["attachments"]) > 0:
             filename = entry["attachments"][0].get("filename")
             if filename and filename.startswith("All Papers/"):
-                rel_path = filename[len("All Papers/") :]
+                # Normalize accents once so every lookup uses the same form
+                rel_path = unicodedata.normalize(
+                    "NFD", filename[len("All Papers/") :]
+                )
                 expected_files.add(rel_path)
                 if entry.get("pmid"):
                     filename_to_pmid[rel_path] = entry["pmid"]
@@ -33,17 +36,29 @@ def load_json_data(
     return expected_files, filename_to_pmid, filename_to_json_path
 
 
+def _iter_pdfs(root: str) -> Iterator[str]:
+    """Yield the path of every PDF under root without following symlinks."""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        stack.append(entry.path)
+                elif entry.name.lower().endswith(".pdf"):
+                    yield entry.path
+
+
 def scan_pdf_directory(pdf_dir: str) -> Dict[str, str]:
     """Recursively scan directory for PDF files."""
-    pdf_files = {}
-    base_dir = Path(pdf_dir)
-    for root, _, files in os.walk(pdf_dir):
-        for file in files:
-            if file.lower().endswith(".pdf"):
-                full_path = Path(root) / file
-                rel_path = str(full_path.relative_to(base_dir))
-                pdf_files[rel_path] = str(full_path.absolute())
-    return pdf_files
+    # Entries under an absolute root are absolute, so the relative path is
+    # just the part after the root and its separator
+    base_dir = os.path.abspath(pdf_dir)
+    prefix_len = len(base_dir) + 1
+    return {
+        unicodedata.normalize("NFD", path[prefix_len:]): path
+        for path in _iter_pdfs(base_dir)
+    }
 
 
 def write_csv_report(
@@ -58,7 +73,6 @@ def write_csv_report(
         writer.writerow(["Actual File Path", "PMID", "JSON Filename"])
 
         for rel_path, abs_path in sorted(actual_files.items()):
-            assert Path(abs_path).exists()
             pmid = filename_to_pmid.get(rel_path, "")
             json_path = filename_to_json_path.get(rel_path, "")
             writer.writerow([abs_path, pmid, json_path])
@@ -93,13 +107,8 @@ def main():
     actual_files = scan_pdf_directory(str(pdf_dir))
     print(f"Found {len(actual_files)} PDF files in directory")
 
-    # Compare sets
-    actual_set = set(actual_files.keys())
-    # Remove accents from expected_files
-    expected_files = {
-        unicodedata.normalize("NFD", file) for file in expected_files
-    }
-    actual_set = {unicodedata.normalize("NFD", file) for file in actual_set}
+    # Compare sets; both sides were NFD-normalized when loaded
+    actual_set = actual_files.keys()
     missing_pdfs = expected_files - actual_set
     extra_pdfs = actual_set - expected_files
 
@@ -4,11 +4,13 @@ import pandas as pd
 import logging
 import time
 from pathlib import Path
-import aiofiles
-from typing import List, Dict
+import aiofiles  # type: ignore
+from typing import Dict
 import os
 import ssl
 
+import certifi
+
 # Set up logging
 epoch = int(time.time())
 logging.basicConfig(
@@ -21,6 +23,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Size of each chunk streamed from the response to disk
+CHUNK_SIZE = 1 << 16
+# Maximum number of PDFs downloading at once
+MAX_CONCURRENCY = 64
+
+
+async def save_response(
+    response: aiohttp.ClientResponse, filepath: Path
+) -> None:
+    """Stream a response body to filepath once it has fully arrived"""
+    # Write to a sibling .part file so a failed download never leaves a
+    # truncated PDF that later runs would skip as already downloaded
+    part_path = filepath.with_name(f"{filepath.name}.part")
+    try:
+        async with aiofiles.open(part_path, "wb") as f:
+            async for data in response.content.iter_chunked(CHUNK_SIZE):
+                await f.write(data)
+        os.replace(part_path, filepath)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
 
 async def download_pdf(
     session: aiohttp.ClientSession, pmid: int, url: str, backup_url: str
@@ -29,8 +53,17 @@ async def download_pdf(
     filename = f"{pmid}.pdf"
     filepath = Path("pdfs") / filename
 
-    # Create pdfs directory if it doesn't exist
-    os.makedirs("pdfs", exist_ok=True)
+    # Skip files left by an earlier run
+    try:
+        if filepath.stat().st_size > 0:
+            logger.debug(f"Already downloaded {pmid}")
+            return {
+                "PMID": pmid,
+                "Status": "skipped",
+                "Filepath": str(filepath),
+            }
+    except FileNotFoundError:
+        pass
 
     try:
         # Try primary URL first
@@ -38,8 +71,7 @@ async def download_pdf(
             try:
                 async with session.get(url) as response:
                     if response.status == 200:
-                        async with aiofiles.open(filepath, "wb") as f:
-                            await f.write(await response.read())
+                        await save_response(response, filepath)
                         logger.info(
                             f"Successfully downloaded {pmid} from primary URL"
                         )
@@ -56,8 +88,7 @@ async def download_pdf(
             try:
                 async with session.get(backup_url) as response:
                     if response.status == 200:
-                        async with aiofiles.open(filepath, "wb") as f:
-                            await f.write(await response.read())
+                        await save_response(response, filepath)
                         logger.info(
                             f"Successfully downloaded {pmid} from backup URL"
                         )
@@ -78,54 +109,58 @@ async def download_pdf(
         return {"PMID": pmid, "Status": "failed", "Filepath": ""}
 
 
-async def process_chunk(
+async def download_pdf_bounded(
+    semaphore: asyncio.Semaphore,
     session: aiohttp.ClientSession,
-    chunk_data: pd.DataFrame,
-    chunk_num: int,
-    total_chunks: int,
-) -> List[Dict]:
-    """Process a chunk of PMIDs"""
-    logger.info(f"Processing chunk {chunk_num}/{total_chunks}")
-    tasks = []
-    for _, row in chunk_data.iterrows():
-        task = download_pdf(
-            session, row["PMID"], row["URL"], row["Backup URL"]
-        )
-        tasks.append(task)
-
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    return [r for r in results if not isinstance(r, Exception)]
+    pmid: int,
+    url: str,
+    backup_url: str,
+) -> Dict:
+    """Download a PDF once a concurrency slot is free"""
+    async with semaphore:
+        return await download_pdf(session, pmid, url, backup_url)
 
 
 async def main():
     # Read the CSV file
     df = pd.read_csv("missing_pmids_urls_with_cert_10s_timeout.csv")
 
-    # Calculate chunks
-    chunk_size = 10
-    chunks = [df[i : i + chunk_size] for i in range(0, len(df), chunk_size)]
-    total_chunks = len(chunks)
-
-    results = []
-    timeout = aiohttp.ClientTimeout(total=30)  # 30 second timeout
-    ca_file: Path = Path(
-        r".venv/lib/python3.11/site-packages/certifi/cacert.pem"
+    # Time the sockets themselves, with a generous total deadline: it also
+    # counts the wait for a free per-host connection, which is long when
+    # most URLs point at one publisher, but stops a server that trickles
+    # bytes from holding a slot forever
+    timeout = aiohttp.ClientTimeout(total=300, sock_connect=10, sock_read=30)
+    # One context for every connection, so TLS sessions can be resumed
+    ssl_context = ssl.create_default_context(cafile=certifi.where())
+    # Per-host limit keeps a single publisher from being hammered; cached
+    # DNS and long-lived keep-alive let repeat requests skip the lookup and
+    # handshake
+    connector = aiohttp.TCPConnector(
+        ssl=ssl_context,
+        limit=MAX_CONCURRENCY,
+        limit_per_host=16,
+        ttl_dns_cache=300,
+        keepalive_timeout=75,
     )
-    assert ca_file.exists(), "CA file not found"
-    ssl_context = ssl.create_default_context(cafile=str(ca_file.absolute()))
-    connector = aiohttp.TCPConnector(ssl=ssl_context)
+
+    # Create pdfs directory if it doesn't exist
+    os.makedirs("pdfs", exist_ok=True)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
     async with aiohttp.ClientSession(
-        connector=connector, timeout=timeout
+        connector=connector, timeout=timeout, read_bufsize=1 << 20
     ) as session:
-        for i, chunk in enumerate(chunks, 1):
-            chunk_results = await process_chunk(
-                session, chunk, i, total_chunks
+        logger.info(f"Downloading {len(df)} PDFs, {MAX_CONCURRENCY} at a time")
+        tasks = [
+            asyncio.create_task(
+                download_pdf_bounded(semaphore, session, pmid, url, backup_url)
             )
-            results.extend(chunk_results)
-
-            if i < total_chunks:  # Don't sleep after the last chunk
-                logger.info("Sleeping between chunks...")
-                await asyncio.sleep(1)
+            for pmid, url, backup_url in zip(
+                df["PMID"], df["URL"], df["Backup URL"]
+            )
+        ]
+        gathered = await asyncio.gather(*tasks, return_exceptions=True)
+        results = [r for r in gathered if not isinstance(r, Exception)]
 
     # Create results DataFrame and save to CSV
     results_df = pd.DataFrame(results)
@@ -0,0 +1,58 @@
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def cached_excel_column(
+    path: Path, sheet: str = "Missing", column: str = "Missing PMIDs"
+) -> np.ndarray:
+    """
+    Read one int64 column of an Excel sheet, caching it next to the file.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the Excel file
+    sheet : str, optional
+        Name of the sheet to read, by default "Missing"
+    column : str, optional
+        Name of the column to read, by default "Missing PMIDs"
+
+    Returns
+    -------
+    np.ndarray
+        Values of the column, in sheet order
+
+    Notes
+    -----
+    openpyxl parses the whole workbook in Python, so the column is saved to
+    a sibling .npy file on first read and loaded from there while it is
+    newer than the workbook. The cache is named after both the sheet and the
+    column, and is written to a temporary file first so an interrupted
+    write never leaves a corrupt cache behind.
+    """
+    path = Path(path)
+    cache = path.with_suffix(f".{_cache_key(sheet)}.{_cache_key(column)}.npy")
+    if cache.exists() and cache.stat().st_mtime >= path.stat().st_mtime:
+        return np.load(cache)
+    values = pd.read_excel(path, sheet_name=sheet, usecols=[column])[
+        column
+    ].to_numpy(dtype=np.int64)
+    tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+    try:
+        # A file object stops np.save from appending its own .npy suffix
+        with open(tmp, "wb") as f:
+            np.save(f, values)
+        os.replace(tmp, cache)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return values
+
+
+def _cache_key(name: str) -> str:
+    # Sheet and column names may hold spaces, dots or path separators
+    return re.sub(r"[^\w-]+", "_", name)
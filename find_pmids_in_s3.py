@@ -1,11 +1,15 @@
+import argparse
+import numpy as np
 import pandas as pd
-import boto3
-from typing import NamedTuple, Set
+from typing import TYPE_CHECKING, NamedTuple, cast
 import logging
 from pathlib import Path
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor
-import concurrent.futures
+
+from s3_utils import get_s3_client, list_keys, read_inventory_keys
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
 
 
 class PMIDStatus(NamedTuple):
@@ -25,11 +29,18 @@ def setup_logging() -> None:
 def read_pmids_from_csv(csv_path: str | Path) -> list[int]:
     """Read PMIDs from the CSV file"""
     try:
-        df = pd.read_csv(str(csv_path))  # Convert Path to str explicitly
+        # Only parse the PMID column; a callable lets a missing column
+        # through to the check below instead of failing inside read_csv
+        df = pd.read_csv(
+            str(csv_path),  # Convert Path to str explicitly
+            usecols=lambda column: column == "PMID",
+            dtype={"PMID": "Int64"},
+        )
         if "PMID" not in df.columns:
             raise ValueError("CSV file does not contain a 'PMID' column")
 
-        pmids = df["PMID"].dropna().astype(int).unique().tolist()
+        unique = df["PMID"].dropna().unique().astype("int64")
+        pmids = cast(list[int], unique.tolist())
         logging.info(f"Found {len(pmids)} unique PMIDs in CSV")
         return pmids
     except Exception as e:
@@ -37,96 +48,96 @@ def read_pmids_from_csv(csv_path: str | Path) -> list[int]:
         raise
 
 
-def get_existing_pdfs(s3_client: boto3.client, bucket_name: str) -> set[str]:
+def get_existing_pdfs(
+    s3_client: "S3Client",
+    bucket_name: str,
+    inventory_manifest: str | None = None,
+) -> set[str]:
     """
     Get set of existing PDF filenames in the bucket
 
     Args:
         s3_client: Initialized boto3 S3 client
         bucket_name: Name of the S3 bucket
+        inventory_manifest: S3 URI of an S3 Inventory manifest.json for the
+            bucket; when given it is read instead of listing the bucket
 
     Returns:
         Set of PDF filenames that exist in the bucket
     """
+    if inventory_manifest is not None:
+        try:
+            keys = read_inventory_keys(
+                s3_client, inventory_manifest, bucket_name, "pdfs/"
+            )
+        except Exception as e:
+            logging.error(f"Error reading S3 inventory: {str(e)}")
+            raise
+        filenames = keys.str.rsplit("/", n=1).str[-1]
+        existing_pdfs = set(filenames[filenames.str.endswith(".pdf")])
+        logging.info(f"Found {len(existing_pdfs)} PDFs in S3 inventory")
+        return existing_pdfs
+
     existing_pdfs = set()
     try:
-        paginator = s3_client.get_paginator("list_objects_v2")
-        for page in tqdm(
-            paginator.paginate(Bucket=bucket_name, Prefix="pdfs/"),
-            desc="Caching S3 contents",
-        ):
-            if "Contents" in page:
-                for obj in page["Contents"]:
-                    filename = Path(obj["Key"]).name
-                    if filename.endswith(".pdf"):
-                        existing_pdfs.add(filename)
+        # PDFs are named by PMID, so list each leading digit in parallel
+        listed = list_keys(
+            s3_client, bucket_name, "pdfs/", partitions="0123456789"
+        )
+        for key in listed:
+            # Slice the filename off the key rather than building a Path
+            if key.endswith(".pdf"):
+                existing_pdfs.add(key[key.rfind("/") + 1 :])
+        logging.info(f"Found {len(existing_pdfs)} PDFs in S3")
         return existing_pdfs
     except Exception as e:
         logging.error(f"Error listing S3 bucket contents: {str(e)}")
         raise
 
 
-def check_single_pmid(
-    pmid: int, existing_pdfs: Set[str], bucket_name: str
-) -> PMIDStatus:
-    """
-    Check if a single PMID has a corresponding PDF in S3
-
-    Args:
-        pmid: PMID to check
-        existing_pdfs: Set of existing PDF filenames
-        bucket_name: Name of the bucket for constructing S3 URI
-
-    Returns:
-        PMIDStatus object indicating if the PDF was found
-    """
-    filename = f"{pmid}.pdf"
-    if filename in existing_pdfs:
-        s3_key = f"pdfs/{filename}"
-        s3_uri = f"s3://{bucket_name}/{s3_key}"
-        return PMIDStatus(pmid=pmid, found=True, s3_key=s3_key, s3_uri=s3_uri)
-    return PMIDStatus(pmid=pmid, found=False, s3_key=None, s3_uri=None)
-
-
-def check_pmids_in_s3(pmids: list[int], bucket_name: str) -> list[PMIDStatus]:
+def check_pmids_in_s3(
+    pmids: list[int], bucket_name: str, inventory_manifest: str | None = None
+) -> list[PMIDStatus]:
     """
     Check which PMIDs have corresponding PDFs in S3
 
     Args:
         pmids: List of PMIDs to check
         bucket_name: Name of the S3 bucket
+        inventory_manifest: Optional S3 URI of an S3 Inventory manifest.json
 
     Returns:
         List of PMIDStatus objects indicating which PMIDs were found
     """
-    s3_client = boto3.client("s3")
-    results = []
+    s3_client = get_s3_client()
 
     # Get existing PDFs once
-    existing_pdfs = get_existing_pdfs(s3_client, bucket_name)
+    existing_pdfs = get_existing_pdfs(
+        s3_client, bucket_name, inventory_manifest
+    )
 
-    with ThreadPoolExecutor(max_workers=16) as executor:
-        # Create futures for all PMIDs
-        futures = [
-            executor.submit(
-                check_single_pmid, pmid, existing_pdfs, bucket_name
+    # Match every filename against the cache in one vectorized lookup
+    pmid_arr = np.asarray(pmids, dtype=np.int64)
+    filenames = pd.Index(pmid_arr.astype(str)) + ".pdf"
+    found_mask = filenames.isin(existing_pdfs)
+
+    return [
+        (
+            PMIDStatus(
+                pmid=pmid,
+                found=True,
+                s3_key=f"pdfs/{pmid}.pdf",
+                s3_uri=f"s3://{bucket_name}/pdfs/{pmid}.pdf",
             )
-            for pmid in pmids
-        ]
-
-        # Process results as they complete
-        for future in tqdm(
-            concurrent.futures.as_completed(futures),
+            if found
+            else PMIDStatus(pmid=pmid, found=False, s3_key=None, s3_uri=None)
+        )
+        for pmid, found in tqdm(
+            zip(cast(list[int], pmid_arr.tolist()), found_mask),
             desc="Checking PMIDs in S3",
             total=len(pmids),
-        ):
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                logging.error(f"Error processing future: {str(e)}")
-
-    return results
+        )
+    ]
 
 
 def save_results(
@@ -139,24 +150,37 @@ def save_results(
         found_pmids: List of PMIDStatus objects for found PDFs
         missing_pmids: List of PMIDStatus objects for missing PDFs
     """
-    # Save results to files
-    for filename, results, include_uri in [
-        ("found_pmids.txt", found_pmids, True),
-        ("missing_pmids.txt", missing_pmids, False),
+    # Build each file's contents up front and hand it over in one write
+    for filename, lines in [
+        (
+            "found_pmids.txt",
+            [f"{result.pmid},{result.s3_uri}\n" for result in found_pmids],
+        ),
+        (
+            "missing_pmids.txt",
+            [f"{result.pmid}\n" for result in missing_pmids],
+        ),
     ]:
         try:
-            with open(filename, "w") as f:
-                for result in results:
-                    if include_uri:
-                        f.write(f"{result.pmid},{result.s3_uri}\n")
-                    else:
-                        f.write(f"{result.pmid}\n")
+            with open(filename, "w", buffering=1 << 20) as f:
+                f.writelines(lines)
             logging.info(f"Results saved to {filename}")
         except Exception as e:
             logging.error(f"Error saving to {filename}: {str(e)}")
 
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Check which PMIDs have a PDF in S3"
+    )
+    parser.add_argument(
+        "--inventory-manifest",
+        default=None,
+        help="S3 URI of an S3 Inventory manifest.json to read instead of "
+        + "listing the bucket",
+    )
+    args = parser.parse_args()
+
     setup_logging()
 
     # Configuration
@@ -168,7 +192,9 @@ def main():
         pmids = read_pmids_from_csv(CSV_PATH)
 
         # Check S3
-        results = check_pmids_in_s3(pmids, BUCKET_NAME)
+        results = check_pmids_in_s3(
+            pmids, BUCKET_NAME, args.inventory_manifest
+        )
 
         # Analyze results
         found_pmids = [r for r in results if r.found]
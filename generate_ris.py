@@ -1,13 +1,20 @@
 import argparse
+import io
 import os
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+from itertools import islice
 from pathlib import Path
-from typing import Literal
+from typing import Literal, cast
 
 import pandas as pd
 from dotenv import load_dotenv
 from eutils import QueryService  # type: ignore
 from metapub.pubmedarticle import PubMedArticle  # type: ignore
 
+from excel_cache import cached_excel_column
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -26,12 +33,74 @@ def parse_excel_file(filepath: Path) -> set[int]:
     set[int]
         Set of PMIDs from the Excel file
     """
-    df: pd.DataFrame = pd.read_excel(filepath, sheet_name="Missing")
-    pmids: set[int] = set(df["Missing PMIDs"].astype(int))
+    pmids = set(cast(list[int], cached_excel_column(filepath).tolist()))
     return pmids
 
 
-def get_dois(pmids: set[int]) -> pd.DataFrame:
+# Maximum number of PMIDs sent in a single efetch request
+EFETCH_BATCH_SIZE = 200
+# SQLite file caching the DOI found for each PMID between runs
+CACHE_PATH = Path(os.getenv("RIS_CACHE_PATH", "doi_cache.sqlite"))
+
+
+def _parse_dois(xml: bytes) -> dict[int, str | None]:
+    """
+    Pull the DOI of every article out of an efetch response.
+
+    Parameters
+    ----------
+    xml : bytes
+        PubmedArticleSet XML returned by efetch
+
+    Returns
+    -------
+    dict[int, str | None]
+        DOI for each PMID in the response, or None if it has none
+    """
+    dois: dict[int, str | None] = {}
+    for _, elem in ET.iterparse(io.BytesIO(xml), events=("end",)):
+        if elem.tag != "PubmedArticle":
+            continue
+        pmid = int(elem.findtext("MedlineCitation/PMID"))
+        # Same precedence as PubMedArticle.doi
+        doi = elem.findtext(
+            "PubmedData/ArticleIdList/ArticleId[@IdType='doi']"
+        ) or elem.findtext(
+            "MedlineCitation/Article/ELocationID[@EIdType='doi']"
+        )
+        dois[pmid] = doi
+        # Free each article once read so large batches stay small
+        elem.clear()
+    return dois
+
+
+def _open_cache(cache_path: Path) -> sqlite3.Connection:
+    """
+    Open the DOI cache, creating it if needed.
+
+    Parameters
+    ----------
+    cache_path : Path
+        Path to the SQLite cache file
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection to the cache
+    """
+    con = sqlite3.connect(cache_path)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS dois"
+        " (pmid INTEGER PRIMARY KEY, doi TEXT, ts REAL NOT NULL)"
+    )
+    return con
+
+
+def get_dois(
+    pmids: set[int],
+    cache_path: Path = CACHE_PATH,
+    expiration_time: float | None = None,
+) -> pd.DataFrame:
     """
     Retrieve DOIs for given PMIDs using the NCBI API.
 
@@ -39,22 +108,67 @@ def get_dois(pmids: set[int]) -> pd.DataFrame:
     ----------
     pmids : set[int]
         Set of PMIDs
+    cache_path : Path, optional
+        SQLite file caching results between runs, by default the
+        RIS_CACHE_PATH environment variable or doi_cache.sqlite
+    expiration_time : float | None, optional
+        Age in seconds after which a cached result is fetched again, by
+        default None (cached results never expire)
 
     Returns
     -------
     pd.DataFrame
         DataFrame containing PMIDs and their corresponding DOIs
+
+    Notes
+    -----
+    Only PMIDs missing from the cache are fetched, EFETCH_BATCH_SIZE at a
+    time. If a batch cannot be parsed, its PMIDs are fetched one at a time
+    instead. PMIDs whose record has no DOI are cached too, so they are not
+    looked up again until they expire. PMIDs missing from the response,
+    e.g. book records, deleted IDs or a truncated reply, are not cached
+    and are fetched again on the next run.
     """
-    df_dicts: list[dict[str, str | int]] = []
-    qs = QueryService(
-        email=os.getenv("NCBI_EMAIL"), api_key=os.getenv("NCBI_API_KEY")
+    oldest = 0.0 if expiration_time is None else time.time() - expiration_time
+    con = _open_cache(cache_path)
+    try:
+        dois: dict[int, str | None] = dict(
+            con.execute("SELECT pmid, doi FROM dois WHERE ts >= ?", (oldest,))
+        )
+        todo = [pmid for pmid in pmids if pmid not in dois]
+
+        qs = QueryService(
+            email=os.getenv("NCBI_EMAIL"), api_key=os.getenv("NCBI_API_KEY")
+        )
+        pmid_iter = iter(todo)
+        while batch := list(islice(pmid_iter, EFETCH_BATCH_SIZE)):
+            result = qs.efetch(
+                {"db": "pubmed", "id": ",".join(map(str, batch))}
+            )
+            try:
+                fetched = _parse_dois(result)
+            except ET.ParseError:
+                fetched = {}
+                for pmid in batch:
+                    result = qs.efetch({"db": "pubmed", "id": pmid})
+                    pma: PubMedArticle = PubMedArticle(result)
+                    fetched[int(pmid)] = pma.doi
+            # Commit every batch so an interrupted run keeps its progress.
+            # Only PMIDs efetch actually returned are cached: a NULL DOI then
+            # always means the record has none, never that it was missing.
+            now = time.time()
+            with con:
+                con.executemany(
+                    "INSERT OR REPLACE INTO dois VALUES (?, ?, ?)",
+                    [(pmid, doi, now) for pmid, doi in fetched.items()],
+                )
+            dois.update(fetched)
+    finally:
+        con.close()
+
+    return pd.DataFrame.from_records(
+        [(pmid, dois.get(pmid)) for pmid in pmids], columns=["PMID", "DOI"]
     )
-    for pmid in pmids:
-        result = qs.efetch({"db": "pubmed", "id": pmid})
-        pma: PubMedArticle = PubMedArticle(result)
-        df_dict: dict[str, str | int] = {"PMID": pmid, "DOI": pma.doi}
-        df_dicts.append(df_dict)
-    return pd.DataFrame(df_dicts)
 
 
 def generate_ris_file(
@@ -75,12 +189,14 @@ def generate_ris_file(
         Write type, either 'a' for append or 'w' for write (default is 'w')
     """
     with open(out_filepath, write_type) as file:
-        for i, (_, row) in enumerate(to_ris.iterrows()):
-            file.write("TY  - JOUR\n")
-            file.write(f"DO  - {row['DOI']}\n")
-            file.write("ER  -\n")
-            if i < (len(to_ris) - 1):
-                file.write("\n")
+        # Build the whole file and write it at once; records are separated
+        # by a blank line
+        file.write(
+            "\n".join(
+                f"TY  - JOUR\nDO  - {doi}\nER  -\n"
+                for doi in to_ris["DOI"].to_numpy()
+            )
+        )
 
 
 def main():
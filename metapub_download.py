@@ -1,17 +1,24 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
-from functools import partial
+import atexit
+import csv
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
+import random
+import sqlite3
 import time
-import concurrent.futures
-
-import pandas as pd
+from pathlib import Path
+from typing import TextIO, cast
 
+import requests  # type: ignore
 from dotenv import load_dotenv
 
-# Set up logging
+from excel_cache import cached_excel_column
+
+# Set up logging; debug messages use %-style arguments so they are only
+# formatted when DEBUG is enabled
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
 )
@@ -21,83 +28,231 @@ load_dotenv()
 from metapub import FindIt  # type: ignore
 
 # Add rate limiting constants
-REQUESTS_PER_SECOND = (
-    30  # E-utilities allows 3 requests per second without API key
-)
-DELAY = 1.0 / REQUESTS_PER_SECOND
-_last_request_time = 0
-
-
-def find_with_timeout(pmid: int, timeout: int = 10) -> FindIt:
-    # Add rate limiting
-    global _last_request_time
-    current_time = time.time()
-    time_since_last_request = current_time - _last_request_time
-    if time_since_last_request < DELAY:
-        logger.debug(
-            f"Rate limiting: sleeping for {DELAY - time_since_last_request:.2f} seconds"
-        )
-        time.sleep(DELAY - time_since_last_request)
-    _last_request_time = time.time()
+# E-utilities allows 3 requests per second without API key, 10 with one
+REQUESTS_PER_SECOND = 10 if os.getenv("NCBI_API_KEY") else 3
+# Maximum number of FindIt calls in flight at once
+MAX_CONCURRENCY = 32
+# Seconds a single FindIt call may take before it is treated as timed out
+FINDIT_TIMEOUT = 10
+# Retry transient FindIt failures with capped exponential backoff
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+BACKOFF_JITTER = 1.0
+
+# CSV the results are streamed to
+OUTPUT_PATH = Path("missing_pmids_urls.csv")
+# SQLite file caching FindIt results between runs
+CACHE_PATH = Path(os.getenv("FINDIT_CACHE_PATH", "findit_cache.sqlite"))
+# Cached results older than this many seconds are looked up again
+CACHE_MAX_AGE = 90 * 24 * 60 * 60
+# FindIt reasons that may change on the next lookup, so are never cached:
+# TXERROR is a network failure FindIt caught itself, TODO a publisher it
+# could not handle yet
+UNCACHED_REASONS = ("TXERROR", "TODO")
+# Reasons of rows whose lookup failed: get_urls' own timeouts and errors,
+# and network failures FindIt caught itself
+FAILED_REASONS = ("Timeout:", "Error:", "TXERROR")
+# Output columns, in the order they are stored in the cache
+COLUMNS = [
+    "PMID",
+    "URL",
+    "Backup URL",
+    "Reason",
+    "Title",
+    "DOI",
+    "Authors",
+    "Journal",
+]
+
+# FindIt calls share one pool rather than starting a thread per PMID. It
+# has a thread for every worker in gather_urls, but a call
+# that timed out cannot be stopped and keeps its thread until FindIt
+# returns, so later calls may have to wait for one
+_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+atexit.register(_EXECUTOR.shutdown, wait=False)
+
+
+class TokenBucket:
+    """Async rate limiter allowing `rate` acquisitions per second"""
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # The lock queues waiters so tokens are handed out in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.rate, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def __aenter__(self) -> "TokenBucket":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        return None
+
+
+class FindItTimeout(TimeoutError):
+    """A FindIt call was still running when its timeout expired"""
+
+
+async def run_findit(pmid: int):
+    """
+    Run FindIt on the shared pool, timing it from when it starts
+
+    Time spent waiting for a free thread does not count towards
+    FINDIT_TIMEOUT. Raises FindItTimeout if the call is still running when
+    it expires; the call keeps its thread until FindIt returns.
+    """
+    loop = asyncio.get_running_loop()
+    started = loop.create_future()
+
+    def mark_started() -> None:
+        if not started.done():
+            started.set_result(None)
+
+    def call():
+        loop.call_soon_threadsafe(mark_started)
+        return FindIt(pmid)
+
+    future = loop.run_in_executor(_EXECUTOR, call)
+    try:
+        await started
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    # asyncio.wait, unlike wait_for, leaves the call running on timeout
+    done, _ = await asyncio.wait({future}, timeout=FINDIT_TIMEOUT)
+    if not done:
+        raise FindItTimeout(f"FindIt took longer than {FINDIT_TIMEOUT}s")
+    return future.result()
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a FindIt failure is transient and worth retrying"""
+    # A call that is still running holds its thread, so retrying it would
+    # take another
+    if isinstance(error, FindItTimeout):
+        return False
+    # requests' ConnectionError and Timeout (including ReadTimeout) derive
+    # from RequestException, not the builtin ConnectionError/TimeoutError,
+    # and carry no response, so they need their own check
+    if isinstance(
+        error,
+        (
+            TimeoutError,
+            ConnectionError,
+            requests.exceptions.ConnectionError,
+            requests.exceptions.Timeout,
+        ),
+    ):
+        return True
+    # requests' HTTPError carries the response; retry throttling and
+    # server errors but fail fast on other client errors
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is not None and (status == 429 or status >= 500)
+
+
+def open_cache(cache_path: Path = CACHE_PATH) -> sqlite3.Connection:
+    """Open the FindIt cache, creating it if needed"""
+    con = sqlite3.connect(cache_path)
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS findit (pmid INTEGER PRIMARY KEY,"
+        " url TEXT, backup_url TEXT, reason TEXT, title TEXT, doi TEXT,"
+        " authors TEXT, journal TEXT, ts REAL NOT NULL)"
+    )
+    return con
 
-    logger.debug(f"Starting FindIt for PMID {pmid}")
-    with ThreadPoolExecutor(max_workers=1) as executor:  # Limit to 1 worker
-        future = executor.submit(FindIt, pmid)
-        try:
-            result = future.result(timeout=timeout)
-            logger.debug(f"Successfully completed FindIt for PMID {pmid}")
-            return result
-        except (TimeoutError, concurrent.futures.TimeoutError) as e:
-            logger.error(f"Timeout in find_with_timeout for PMID {pmid}")
-            # Cancel the future if possible
-            future.cancel()
-            # Instead of raising, return None to indicate timeout
-            return None
-        except Exception as e:
-            logger.error(
-                f"Unexpected error in find_with_timeout for PMID {pmid}: {str(e)}"
+
+def load_cached_urls(
+    con: sqlite3.Connection, max_age: float = CACHE_MAX_AGE
+) -> dict[int, dict[str, int | str | None]]:
+    """Return every cached result newer than max_age seconds, by PMID"""
+    rows = con.execute(
+        "SELECT pmid, url, backup_url, reason, title, doi, authors, journal"
+        " FROM findit WHERE ts >= ?",
+        (time.time() - max_age,),
+    )
+    return {row[0]: dict(zip(COLUMNS, row)) for row in rows}
+
+
+async def cache_writer(con: sqlite3.Connection, queue: asyncio.Queue) -> None:
+    """
+    Write results from queue to the cache until it receives None
+
+    Being the only writer avoids lock contention, and whatever has queued
+    up while a batch was committing goes into the next commit.
+    """
+    done = False
+    while not done:
+        rows = [await queue.get()]
+        while not queue.empty():
+            rows.append(queue.get_nowait())
+        if None in rows:
+            done = True
+            rows = [row for row in rows if row is not None]
+        now = time.time()
+        with con:
+            con.executemany(
+                "INSERT OR REPLACE INTO findit"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [[row[c] for c in COLUMNS] + [now] for row in rows],
             )
-            future.cancel()
-            return None
 
 
-async def get_urls(pmid: int) -> dict[str, int | str | None]:
+async def get_urls(
+    pmid: int,
+    rate_limiter: TokenBucket,
+    cache_queue: asyncio.Queue | None = None,
+) -> dict[str, int | str | None]:
     try:
         logger.info(f"Starting get_urls for PMID: {pmid}")
-        article = await asyncio.wait_for(
-            asyncio.get_event_loop().run_in_executor(
-                None, partial(find_with_timeout, pmid)
-            ),
-            timeout=2,  # Add another timeout layer
-        )
-
-        if article is None:
-            return {
-                "PMID": pmid,
-                "URL": None,
-                "Backup URL": None,
-                "Reason": "Timeout or error in FindIt",
-                "Title": None,
-                "DOI": None,
-                "Authors": None,
-                "Journal": None,
-            }
-
-        logger.debug(f"Successfully got article for PMID {pmid}")
+        for attempt in range(MAX_RETRIES):
+            try:
+                # Wait for a rate limit token without blocking a thread
+                async with rate_limiter:
+                    logger.debug("Starting FindIt for PMID %s", pmid)
+                    article = await run_findit(pmid)
+                break
+            except Exception as e:
+                if attempt == MAX_RETRIES - 1 or not is_retryable(e):
+                    raise
+                delay = min(
+                    BACKOFF_CAP, BACKOFF_BASE * 2**attempt
+                ) + random.uniform(0, BACKOFF_JITTER)
+                logger.warning(
+                    f"Retrying PMID {pmid} in {delay:.1f}s"
+                    + f" after attempt {attempt + 1} failed: {e!r}"
+                )
+                await asyncio.sleep(delay)
+
+        logger.debug("Successfully got article for PMID %s", pmid)
 
         url = article.url
-        logger.debug(f"Found URL for PMID {pmid}: {url}")
+        logger.debug("Found URL for PMID %s: %s", pmid, url)
 
         # Add more detailed logging for each step
         try:
             backup_url = article.backup_url
-            logger.debug(f"Got backup URL for PMID {pmid}: {backup_url}")
+            logger.debug("Got backup URL for PMID %s: %s", pmid, backup_url)
         except AttributeError:
-            logger.debug(f"No backup URL available for PMID {pmid}")
+            logger.debug("No backup URL available for PMID %s", pmid)
             backup_url = ""
 
         if article and article.pma:
-            logger.debug(f"Processing PMA data for PMID {pmid}")
+            logger.debug("Processing PMA data for PMID %s", pmid)
             doi: str = article.pma.doi or ""
             title: str = article.pma.title or ""
             authors_str: str = article.pma.authors_str or ""
@@ -112,7 +267,7 @@ async def get_urls(pmid: int) -> dict[str, int | str | None]:
                 reason = article.reason
             else:
                 reason = "article.pma.reason was None"
-        return {
+        result = {
             "PMID": pmid,
             "URL": url,
             "Backup URL": backup_url,
@@ -122,6 +277,12 @@ async def get_urls(pmid: int) -> dict[str, int | str | None]:
             "Authors": authors_str,
             "Journal": journal,
         }
+        # Only completed lookups are cached; failures, including ones FindIt
+        # reports through the reason rather than raising, are retried next
+        # run
+        if cache_queue is not None and not reason.startswith(UNCACHED_REASONS):
+            cache_queue.put_nowait(result)
+        return result
     except TimeoutError as e:
         logger.error(f"Timeout error for PMID {pmid}: {e}")
         return {
@@ -148,80 +309,123 @@ async def get_urls(pmid: int) -> dict[str, int | str | None]:
         }
 
 
-async def gather_urls(pmids: set[int]) -> pd.DataFrame:
-    chunk_size = 10  # Reduce chunk size if needed
-    all_results = []
+async def url_worker(
+    pmid_queue: asyncio.Queue,
+    rate_limiter: TokenBucket,
+    output: csv.DictWriter,
+    output_file: TextIO,
+    cache_queue: asyncio.Queue | None = None,
+) -> tuple[int, int]:
+    """
+    Get URLs for PMIDs from the queue until it is empty, saving each row
+
+    Returns the number of rows written and how many of them succeeded.
+    """
+    written = 0
+    succeeded = 0
+    while True:
+        try:
+            pmid = pmid_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return written, succeeded
+        try:
+            result = await get_urls(pmid, rate_limiter, cache_queue)
+        except Exception as e:
+            # The PMID has no row in the CSV
+            logger.error(f"Failed to process PMID {pmid}: {e}")
+            continue
+        # The row is written without awaiting, so rows from concurrent
+        # workers cannot interleave
+        output.writerow(result)
+        output_file.flush()
+        written += 1
+        if not str(result["Reason"]).startswith(FAILED_REASONS):
+            succeeded += 1
+
+
+async def gather_urls(
+    pmids: set[int],
+    output_path: Path = OUTPUT_PATH,
+    cache_path: Path = CACHE_PATH,
+) -> int:
+    """
+    Look up URLs for every PMID, writing each row to a CSV as it completes
+
+    Returns the number of PMIDs written to the CSV.
+    """
     total_pmids = len(pmids)
 
-    logger.info(
-        f"Starting to process {total_pmids} PMIDs in chunks of {chunk_size}"
-    )
+    con = open_cache(cache_path)
+    cached = load_cached_urls(con)
 
-    for i in range(0, total_pmids, chunk_size):
-        chunk = list(pmids)[i : i + chunk_size]
-        chunk_num = i // chunk_size + 1
-        total_chunks = -(-total_pmids // chunk_size)
+    # newline="" as required by the csv module
+    with open(output_path, "w", newline="") as output_file:
+        output = csv.DictWriter(output_file, fieldnames=COLUMNS)
+        output.writeheader()
+
+        pmid_queue: asyncio.Queue = asyncio.Queue()
+        num_cached = 0
+        for pmid in pmids:
+            if pmid in cached:
+                output.writerow(cached[pmid])
+                num_cached += 1
+            else:
+                pmid_queue.put_nowait(pmid)
+        output_file.flush()
+        logger.info(f"Found {num_cached} PMIDs in the FindIt cache")
 
         logger.info(
-            f"Starting chunk {chunk_num}/{total_chunks} with PMIDs: {chunk}"
+            f"Starting to process {pmid_queue.qsize()} PMIDs,"
+            + f" {MAX_CONCURRENCY} at a time"
         )
 
-        tasks = [get_urls(pmid) for pmid in chunk]
+        # A fixed set of workers drains the queue, so only MAX_CONCURRENCY
+        # lookups and their rows are held at once, and one slow PMID does
+        # not hold up the rest
+        # The rate limiter's lock belongs to this run's event loop
+        rate_limiter = TokenBucket(REQUESTS_PER_SECOND)
+        cache_queue: asyncio.Queue = asyncio.Queue()
+        writer = asyncio.create_task(cache_writer(con, cache_queue))
         try:
-            logger.debug(f"Awaiting gather for chunk {chunk_num}")
-            # Add timeout for the entire chunk
-            chunk_results = await asyncio.wait_for(
-                asyncio.gather(*tasks, return_exceptions=True),
-                timeout=30,  # Timeout for entire chunk
-            )
-            logger.debug(f"Gather completed for chunk {chunk_num}")
-
-            # Filter out exceptions and log them
-            processed_results = []
-            for idx, result in enumerate(chunk_results):
-                if isinstance(result, Exception):
-                    pmid = chunk[idx]  # Get the PMID that caused the error
-                    logger.error(
-                        f"Failed to process PMID {pmid} in chunk {chunk_num}: {result}"
+            counts = await asyncio.gather(
+                *(
+                    url_worker(
+                        pmid_queue,
+                        rate_limiter,
+                        output,
+                        output_file,
+                        cache_queue,
                     )
-                else:
-                    processed_results.append(result)
-
-            logger.info(
-                f"Successfully processed {len(processed_results)}/{len(chunk)} PMIDs in chunk {chunk_num}"
+                    for _ in range(MAX_CONCURRENCY)
+                )
             )
-            all_results.extend(processed_results)
-        except asyncio.TimeoutError:
-            logger.error(
-                f"Entire chunk {chunk_num} timed out, moving to next chunk"
-            )
-            continue
-        except Exception as e:
-            logger.error(f"Fatal error processing chunk {chunk_num}: {e}")
-            continue
+        finally:
+            cache_queue.put_nowait(None)
+            await writer
+            con.close()
 
-        logger.info(
-            f"Completed chunk {chunk_num}/{total_chunks}, sleeping for 1 second"
-        )
-        await asyncio.sleep(1)
+    # Cached rows never have a failed reason
+    written = num_cached + sum(w for w, _ in counts)
+    succeeded = num_cached + sum(s for _, s in counts)
 
-    logger.info(f"Finished processing all {total_pmids} PMIDs")
-    return pd.DataFrame(all_results)
+    logger.info(
+        f"Finished processing all {total_pmids} PMIDs,"
+        + f" {written} written, {succeeded} succeeded"
+    )
+    return written
 
 
 async def main() -> None:
     try:
         logger.info("Starting main process")
-        df: pd.DataFrame = pd.read_excel(
-            "pmid_compare_total_vs_s3_20240117.xlsx",
-            sheet_name="Missing",
+        column = cached_excel_column(
+            Path("pmid_compare_total_vs_s3_20240117.xlsx")
         )
-        pmids: set[int] = set(df["Missing PMIDs"].astype(int))
+        pmids = set(cast(list[int], column.tolist()))
         logger.info(f"Loaded {len(pmids)} PMIDs from Excel file")
 
-        urls_df = await gather_urls(pmids)
-        logger.info("Saving results to CSV file")
-        urls_df.to_csv("missing_pmids_urls.csv", index=False)
+        await gather_urls(pmids)
+        logger.info(f"Results saved to {OUTPUT_PATH}")
         logger.info("Process completed successfully")
     except Exception as e:
         logger.error(f"Fatal error in main: {e}")
@@ -1,9 +1,10 @@
 import pandas as pd
-import boto3
 import os
 import logging
 import argparse
 
+from s3_utils import create_transfer, list_keys
+
 
 def setup_logging():
     logging.basicConfig(
@@ -13,7 +14,11 @@ def setup_logging():
 
 
 def rename_and_upload_pdfs(
-    csv_path, s3_uri="s3://osm-pdf-uploads/pdfs", dry_run=False
+    csv_path,
+    s3_uri="s3://osm-pdf-uploads/pdfs",
+    dry_run=False,
+    max_concurrency=16,
+    overwrite=False,
 ):
     """
     Read CSV file, rename PDFs using PMID, and upload to S3.
@@ -22,6 +27,9 @@ def rename_and_upload_pdfs(
         csv_path (str): Path to the CSV file
         s3_uri (str): S3 URI where files should be uploaded
         dry_run (bool): If True, only show what would be done without uploading
+        max_concurrency (int): Maximum number of uploads in flight at once
+        overwrite (bool): If True, also upload files whose key already exists
+            in S3
     """
     logger = setup_logging()
 
@@ -32,10 +40,6 @@ def rename_and_upload_pdfs(
     bucket_name = s3_uri.split("/")[2]
     prefix = "/".join(s3_uri.split("/")[3:])
 
-    # Initialize S3 client if not dry run
-    if not dry_run:
-        s3_client = boto3.client("s3")
-
     # Read CSV file
     try:
         df = pd.read_csv(csv_path)
@@ -43,11 +47,18 @@ def rename_and_upload_pdfs(
         logger.error(f"Failed to read CSV file: {e}")
         return
 
-    # Process each row
-    for _, row in df.iterrows():
+    # Process each row, collecting the uploads to run in parallel
+    try:
+        source_paths = df["Actual File Path"].to_numpy()
+        pmid_values = df["PMID"].to_numpy()
+    except KeyError as e:
+        logger.error(f"CSV file is missing column {e}")
+        return
+
+    uploads = []
+    for source_path, pmid_value in zip(source_paths, pmid_values):
         try:
-            source_path = row["Actual File Path"]
-            pmid = str(int(row["PMID"]))
+            pmid = str(int(pmid_value))
 
             # Skip if PMID is empty
             if not pmid or pd.isna(pmid):
@@ -70,20 +81,62 @@ def rename_and_upload_pdfs(
                     "s3://{}/{}".format(source_path, bucket_name, s3_key)
                 )
             else:
-                try:
-                    logger.info(
-                        "Uploading {} to "
-                        "s3://{}/{}".format(source_path, bucket_name, s3_key)
-                    )
-                    s3_client.upload_file(source_path, bucket_name, s3_key)
-                    logger.info(f"Successfully uploaded {new_filename}")
-                except Exception as e:
-                    logger.error(f"Failed to upload {source_path}: {e}")
+                uploads.append((source_path, s3_key, new_filename))
 
         except Exception as e:
             logger.error(f"Error processing row: {e}")
             continue
 
+    # Rows sharing a PMID would upload to the same key concurrently, leaving
+    # whichever finished last; keep the last row, as a serial loop would
+    latest = {}
+    for upload in uploads:
+        previous = latest.get(upload[1])
+        if previous is not None:
+            logger.warning(
+                f"Duplicate PMID for {upload[1]}: skipping {previous[0]}"
+                + f" in favour of {upload[0]}"
+            )
+        latest[upload[1]] = upload
+    uploads = list(latest.values())
+
+    if dry_run or not uploads:
+        return
+
+    # One client and pool of transfer threads shared by every upload, with
+    # enough connections that no thread waits on the pool
+    with create_transfer(max_concurrency=max_concurrency) as transfer:
+        if not overwrite:
+            # Files are named by PMID, so list each leading digit in parallel
+            existing = set(
+                list_keys(
+                    transfer.client, bucket_name, f"{prefix}/", "0123456789"
+                )
+            )
+            to_upload = [u for u in uploads if u[1] not in existing]
+            skipped = len(uploads) - len(to_upload)
+            if skipped > 0:
+                logger.info(
+                    f"Skipping {skipped} files that already exist in S3"
+                )
+            uploads = to_upload
+
+        futures = []
+        for source_path, s3_key, new_filename in uploads:
+            logger.info(
+                "Uploading {} to "
+                "s3://{}/{}".format(source_path, bucket_name, s3_key)
+            )
+            future = transfer.upload(source_path, bucket_name, s3_key)
+            futures.append((future, source_path, new_filename))
+
+        for future, source_path, new_filename in futures:
+            try:
+                future.result()
+                logger.info(f"Successfully uploaded {new_filename}")
+            except Exception as e:
+                logger.error(f"Failed to upload {source_path}: {e}")
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -100,6 +153,23 @@ if __name__ == "__main__":
         action="store_true",
         help="Show what would be done without actually uploading files",
     )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=16,
+        help="Maximum number of uploads in flight at once (default: 16)",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Upload files even if their key already exists in S3",
+    )
 
     args = parser.parse_args()
-    rename_and_upload_pdfs(args.csv_path, args.s3_uri, args.dry_run)
+    rename_and_upload_pdfs(
+        args.csv_path,
+        args.s3_uri,
+        args.dry_run,
+        args.max_concurrency,
+        args.overwrite,
+    )
@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
 import logging
+import re
 from pathlib import Path
-from typing import Dict, Set
+from typing import TYPE_CHECKING, Dict, Optional, Set
 
-import boto3
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook  # type: ignore
+
+from s3_utils import get_s3_client, list_keys, read_inventory_keys
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
 
 # Configure logger to write to a log file
 logging.basicConfig(
@@ -17,6 +23,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Key whose filename stem (the part before the last extension) is a PMID.
+# Longer digit runs would overflow int64, so they are not PMIDs.
+_PMID_RE = re.compile(r"(?:^|/)(\d{1,18})(?:\.[^./]+)?$")
+
 
 def parse_csv_pmids(csv_path: str, has_header: bool) -> Set[int]:
     """
@@ -38,32 +48,68 @@ def parse_csv_pmids(csv_path: str, has_header: bool) -> Set[int]:
     -----
     This function logs any duplicate PMIDs found in the CSV file
     """
-    pmids: set = set()
-    seen_pmids: dict[int, int] = (
-        {}
-    )  # Dictionary to store PMID and its first occurrence row number
-
-    with open(csv_path, "r") as f:
-        reader: csv.DictReader = csv.DictReader(f)
-        start_row = 2 if has_header else 1
-        for i, row in enumerate(reader, start=start_row):
-            try:
-                pmid = int(row["PMID"])
-                if pmid in pmids:
-                    logger.warning(
-                        f"Duplicate PMID {pmid} found in row {i}. "
-                        + f"First occurrence in row {seen_pmids[pmid]}"
-                    )
-                else:
-                    pmids.add(pmid)
-                    seen_pmids[pmid] = i
-            except ValueError:
-                logger.error(f"Invalid PMID format in row {i}: {row['PMID']}")
-
-    return pmids
-
-
-def get_s3_pmids(s3_uri: str) -> Set[int]:
+    # Read as text so invalid values can be reported rather than coerced
+    df = pd.read_csv(
+        csv_path, usecols=["PMID"], dtype=str, keep_default_na=False
+    )
+    start_row = 2 if has_header else 1
+    rows = pd.Series(df.index + start_row, index=df.index)
+
+    values = df["PMID"].str.strip()
+    # Accept what int() would, short of values that overflow int64
+    valid = values.str.fullmatch(r"[+-]?\d{1,18}")
+    for i, value in zip(rows[~valid], df.loc[~valid, "PMID"]):
+        logger.error(f"Invalid PMID format in row {i}: {value}")
+
+    pmids = values[valid].astype("int64")
+    rows = rows[valid]
+    duplicated = pmids.duplicated(keep="first")
+    if duplicated.any():
+        first_rows = rows.groupby(pmids).transform("first")
+        for pmid, i, first in zip(
+            pmids[duplicated], rows[duplicated], first_rows[duplicated]
+        ):
+            logger.warning(
+                f"Duplicate PMID {pmid} found in row {i}. "
+                + f"First occurrence in row {first}"
+            )
+
+    return set(pmids[~duplicated].tolist())
+
+
+def pmids_from_keys(keys: pd.Series) -> Set[int]:
+    """
+    Extract PMIDs from the filenames of S3 object keys.
+
+    Parameters
+    ----------
+    keys : pd.Series
+        S3 object keys
+
+    Returns
+    -------
+    Set[int]
+        Set of unique PMIDs from filenames of the form <PMID>.<ext>
+
+    Notes
+    -----
+    Logs a warning for every filename that is not a PMID
+    """
+    pmids = keys.str.extract(_PMID_RE.pattern, expand=False)
+    is_pmid = pmids.notna()
+    if not is_pmid.all():
+        # Filename without directory or extension, as Path.stem would give
+        bad = keys[~is_pmid].str.rsplit("/", n=1).str[-1]
+        for filename in bad.str.rsplit(".", n=1).str[0]:
+            logger.warning(f"Could not parse PMID from filename: {filename}")
+    return set(pmids[is_pmid].astype("int64").tolist())
+
+
+def get_s3_pmids(
+    s3_uri: str,
+    inventory_manifest: str | None = None,
+    s3_client: Optional["S3Client"] = None,
+) -> Set[int]:
     """
     Retrieve all PMIDs from PDF filenames in an S3 bucket/prefix.
 
@@ -71,6 +117,11 @@ def get_s3_pmids(s3_uri: str) -> Set[int]:
     ----------
     s3_uri : str
         S3 URI in the format 's3://bucket-name/optional/prefix'
+    inventory_manifest : str | None, optional
+        S3 URI of an S3 Inventory manifest.json for the bucket. When given
+        it is read instead of listing the bucket, by default None
+    s3_client : Optional[S3Client], optional
+        S3 client to use, by default the shared client from get_s3_client
 
     Returns
     -------
@@ -85,55 +136,65 @@ def get_s3_pmids(s3_uri: str) -> Set[int]:
         else ""
     )
 
-    s3_client = boto3.client("s3")
-    pmids = set()
+    if s3_client is None:
+        s3_client = get_s3_client()
+
+    if inventory_manifest is not None:
+        keys = read_inventory_keys(
+            s3_client, inventory_manifest, bucket_name, prefix
+        )
+        return pmids_from_keys(keys)
+
+    # Filenames are PMIDs, so when the prefix is a directory list each
+    # leading digit in parallel
+    partitions = None
+    if not prefix or prefix.endswith("/"):
+        partitions = "0123456789"
+    listed = list_keys(s3_client, bucket_name, prefix, partitions)
+    return pmids_from_keys(pd.Series(listed, dtype=str))
 
-    paginator = s3_client.get_paginator("list_objects_v2")
-    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
-        if "Contents" in page:
-            for obj in page["Contents"]:
-                filename = Path(
-                    obj["Key"]
-                ).stem  # Get filename without extension
-                try:
-                    pmid = int(filename)
-                    pmids.add(pmid)
-                except ValueError:
-                    logger.warning(
-                        f"Could not parse PMID from filename: {filename}"
-                    )
 
-    return pmids
+def _sorted_pmids(pmids: Set[int] | np.ndarray) -> np.ndarray:
+    """Sorted unique int64 array of PMIDs"""
+    if not isinstance(pmids, np.ndarray):
+        pmids = np.fromiter(pmids, dtype=np.int64, count=len(pmids))
+    return np.unique(pmids.astype(np.int64, copy=False))
 
 
-def analyze_pmids(csv_pmids: Set[int], s3_pmids: Set[int]) -> Dict:
+def analyze_pmids(
+    csv_pmids: Set[int] | np.ndarray, s3_pmids: Set[int] | np.ndarray
+) -> Dict:
     """
     Compare PMIDs from CSV and S3 to generate analysis.
 
     Parameters
     ----------
-    csv_pmids : Set[int]
-        Set of PMIDs from CSV file
-    s3_pmids : Set[int]
-        Set of PMIDs from S3 bucket
+    csv_pmids : Set[int] | np.ndarray
+        PMIDs from CSV file
+    s3_pmids : Set[int] | np.ndarray
+        PMIDs from S3 bucket
 
     Returns
     -------
     Dict
-        Dictionary containing analysis results
+        Dictionary containing analysis results; missing_pmids and
+        extra_pmids are sorted int64 arrays
     """
-    common_pmids = csv_pmids.intersection(s3_pmids)
-    missing_pmids = csv_pmids - s3_pmids
-    extra_pmids = s3_pmids - csv_pmids
+    # Sorted unique int64 arrays let numpy do the set arithmetic in C
+    csv_arr = _sorted_pmids(csv_pmids)
+    s3_arr = _sorted_pmids(s3_pmids)
+    in_s3 = np.isin(csv_arr, s3_arr, assume_unique=True)
+    missing_pmids = csv_arr[~in_s3]
+    extra_pmids = np.setdiff1d(s3_arr, csv_arr, assume_unique=True)
 
     return {
-        "csv_unique": len(csv_pmids),
-        "s3_unique": len(s3_pmids),
-        "common": len(common_pmids),
+        "csv_unique": len(csv_arr),
+        "s3_unique": len(s3_arr),
+        "common": int(in_s3.sum()),
         "missing": len(missing_pmids),
         "extra": len(extra_pmids),
-        "missing_pmids": sorted(list(missing_pmids)),
-        "extra_pmids": sorted(list(extra_pmids)),
+        "missing_pmids": missing_pmids,
+        "extra_pmids": extra_pmids,
     }
 
 
@@ -159,42 +220,51 @@ def create_excel_report(
         csv_stem: str = Path(csv_path).stem
         s3_uri_str: str = s3_uri.split("s3://")[1].replace("/", "_")
         output_path = f"pmid_compare_{csv_stem}_{s3_uri_str}.xlsx"
-    with pd.ExcelWriter(output_path) as writer:
-        # Summary sheet
-        summary_data = {
-            "Metric": [
-                "CSV Filepath",
-                "S3 URI",
-                "Unique PMIDs in CSV",
-                "Unique PDFs in S3",
-                "PMIDs in both CSV and S3",
-                "PMIDs in CSV but not in S3",
-                "PMIDs in S3 but not in CSV",
-            ],
-            "Count": [
-                csv_path,
-                s3_uri,
-                analysis["csv_unique"],
-                analysis["s3_unique"],
-                analysis["common"],
-                analysis["missing"],
-                analysis["extra"],
-            ],
-        }
-        print(summary_data)
-        pd.DataFrame(summary_data).to_excel(
-            writer, sheet_name="Summary", index=False
-        )
+    # Summary sheet
+    summary_data = {
+        "Metric": [
+            "CSV Filepath",
+            "S3 URI",
+            "Unique PMIDs in CSV",
+            "Unique PDFs in S3",
+            "PMIDs in both CSV and S3",
+            "PMIDs in CSV but not in S3",
+            "PMIDs in S3 but not in CSV",
+        ],
+        "Count": [
+            csv_path,
+            s3_uri,
+            analysis["csv_unique"],
+            analysis["s3_unique"],
+            analysis["common"],
+            analysis["missing"],
+            analysis["extra"],
+        ],
+    }
+    logger.debug("summary_data=%s", summary_data)
 
-        # Missing PMIDs sheet
-        pd.DataFrame({"Missing PMIDs": analysis["missing_pmids"]}).to_excel(
-            writer, sheet_name="Missing", index=False
-        )
+    # A write-only workbook streams rows to disk as they are appended, so
+    # the PMID sheets are written straight from the arrays without building
+    # a DataFrame or a full in-memory worksheet for each
+    workbook = Workbook(write_only=True)
+    summary = workbook.create_sheet("Summary")
+    summary.append(list(summary_data))
+    for row in zip(*summary_data.values()):
+        summary.append(row)
 
-        # Extra PMIDs sheet
-        pd.DataFrame({"Extra PMIDs": analysis["extra_pmids"]}).to_excel(
-            writer, sheet_name="Extras", index=False
-        )
+    # Missing PMIDs sheet
+    missing = workbook.create_sheet("Missing")
+    missing.append(["Missing PMIDs"])
+    for pmid in analysis["missing_pmids"].tolist():
+        missing.append([pmid])
+
+    # Extra PMIDs sheet
+    extras = workbook.create_sheet("Extras")
+    extras.append(["Extra PMIDs"])
+    for pmid in analysis["extra_pmids"].tolist():
+        extras.append([pmid])
+
+    workbook.save(output_path)
 
 
 def main():
@@ -218,6 +288,12 @@ def main():
         action="store_true",
         help="Indicates if the CSV file has a header row",
     )
+    parser.add_argument(
+        "--inventory-manifest",
+        default=None,
+        help="S3 URI of an S3 Inventory manifest.json to read instead of "
+        + "listing the bucket",
+    )
 
     args = parser.parse_args()
 
@@ -225,7 +301,7 @@ def main():
     csv_pmids = parse_csv_pmids(args.csv_path, args.has_header)
 
     logger.info("Retrieving S3 PMIDs...")
-    s3_pmids = get_s3_pmids(args.s3_uri)
+    s3_pmids = get_s3_pmids(args.s3_uri, args.inventory_manifest)
 
     logger.info("Analyzing PMIDs...")
     analysis = analyze_pmids(csv_pmids, s3_pmids)
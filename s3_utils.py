@@ -0,0 +1,274 @@
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING
+from urllib.parse import unquote_plus, urlparse
+
+import boto3
+import pandas as pd
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from botocore.config import Config
+from s3transfer.manager import TransferManager
+
+if TYPE_CHECKING:
+    from mypy_boto3_s3 import S3Client
+
+MB = 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def get_s3_client(max_pool_connections: int = 64) -> "S3Client":
+    """
+    Return the S3 client shared by everything in this process.
+
+    Parameters
+    ----------
+    max_pool_connections : int, optional
+        Size of the client's connection pool, by default 64. Callers asking
+        for the same size get the same client.
+
+    Returns
+    -------
+    S3Client
+        S3 client with adaptive retries for throttling and 5xx errors
+
+    Notes
+    -----
+    boto3 clients are thread-safe, so one client can be used by every
+    thread, reusing its pooled TLS connections.
+    """
+    return boto3.session.Session().client(
+        "s3",
+        config=Config(
+            max_pool_connections=max_pool_connections,
+            retries={"max_attempts": 10, "mode": "adaptive"},
+        ),
+    )
+
+
+def create_transfer(
+    multipart_threshold: int = 8 * MB,
+    multipart_chunksize: int = 16 * MB,
+    max_concurrency: int = 10,
+    io_chunksize: int = 256 * 1024,
+) -> TransferManager:
+    """
+    Create a transfer manager on the shared S3 client.
+
+    Parameters
+    ----------
+    multipart_threshold : int, optional
+        Size in bytes above which multipart transfers are used
+    multipart_chunksize : int, optional
+        Size in bytes of each part or ranged GET
+    max_concurrency : int, optional
+        Maximum number of concurrent S3 requests
+    io_chunksize : int, optional
+        Size in bytes of each local read or write
+
+    Returns
+    -------
+    TransferManager
+        Transfer manager wrapping the client from get_s3_client
+
+    Notes
+    -----
+    Every transfer shares one client and one pool of transfer threads, so
+    connections are reused and large PDFs are moved in parallel parts.
+    """
+    # Enough connections that no transfer thread waits on the pool
+    s3_client = get_s3_client(max_pool_connections=max(64, max_concurrency))
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        io_chunksize=io_chunksize,
+        use_threads=True,
+    )
+    return create_transfer_manager(s3_client, transfer_config)
+
+
+def read_inventory_keys(
+    s3_client: "S3Client",
+    manifest_uri: str,
+    bucket_name: str,
+    prefix: str = "",
+) -> pd.Series:
+    """
+    Read object keys from an S3 Inventory report.
+
+    Parameters
+    ----------
+    s3_client : S3Client
+        Initialized boto3 S3 client
+    manifest_uri : str
+        S3 URI of the report's manifest.json, e.g.
+        s3://inventory-bucket/source-bucket/config-id/<date>/manifest.json
+    bucket_name : str
+        Name of the bucket the keys are expected to come from
+    prefix : str, optional
+        Only return keys starting with this prefix, by default ""
+
+    Returns
+    -------
+    pd.Series
+        Object keys listed in the report
+
+    Raises
+    ------
+    ValueError
+        If the report is for a bucket other than bucket_name, or is in an
+        unsupported format
+
+    Notes
+    -----
+    The listing costs one GET per inventory file instead of one
+    ListObjectsV2 call per 1000 keys. CSV and Parquet reports are
+    supported; Parquet reports require pyarrow.
+    """
+    parsed = urlparse(manifest_uri)
+    response = s3_client.get_object(
+        Bucket=parsed.netloc, Key=parsed.path.lstrip("/")
+    )
+    manifest = json.load(response["Body"])
+    if manifest["sourceBucket"] != bucket_name:
+        raise ValueError(
+            f"Inventory manifest {manifest_uri} lists bucket"
+            f" {manifest['sourceBucket']}, not {bucket_name}"
+        )
+
+    # destinationBucket is an ARN, e.g. arn:aws:s3:::inventory-bucket
+    inventory_bucket = manifest["destinationBucket"].split(":::")[-1]
+    file_format = manifest["fileFormat"].lower()
+    if file_format not in ("csv", "parquet"):
+        raise ValueError(
+            f"Unsupported inventory format: {manifest['fileFormat']}"
+        )
+
+    keys = []
+    for inventory_file in manifest["files"]:
+        body = s3_client.get_object(
+            Bucket=inventory_bucket, Key=inventory_file["key"]
+        )["Body"]
+        if file_format == "csv":
+            # CSV reports have no header row; the columns are in fileSchema
+            columns = [c.strip() for c in manifest["fileSchema"].split(",")]
+            # StreamingBody is file-like but not typed as a read buffer
+            for chunk in pd.read_csv(  # type: ignore[call-overload]
+                body,
+                compression="gzip",
+                header=None,
+                names=columns,
+                usecols=["Key"],
+                dtype=str,
+                chunksize=100_000,
+            ):
+                keys.append(chunk["Key"])
+        else:
+            # Parquet needs a seekable file
+            df = pd.read_parquet(io.BytesIO(body.read()), columns=["key"])
+            keys.append(df["key"].rename("Key"))
+
+    if not keys:
+        return pd.Series([], dtype=str, name="Key")
+    all_keys = pd.concat(keys, ignore_index=True)
+
+    if file_format == "csv":
+        # CSV reports URL-encode keys; only decode the ones that need it
+        encoded = all_keys.str.contains(r"[%+]", regex=True)
+        all_keys[encoded] = all_keys[encoded].map(unquote_plus)
+
+    if prefix:
+        all_keys = all_keys[all_keys.str.startswith(prefix)]
+    return all_keys
+
+
+def _list_prefix(
+    s3_client: "S3Client",
+    bucket_name: str,
+    prefix: str,
+    start_after: str = "",
+    stop: str | None = None,
+) -> list[str]:
+    # S3 lists keys in UTF-8 byte order, which matches str ordering, so the
+    # listing can end at the first key at or past stop
+    keys: list[str] = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=bucket_name,
+        Prefix=prefix,
+        StartAfter=start_after,
+        PaginationConfig={"PageSize": 1000},
+    ):
+        for obj in page.get("Contents", ()):
+            if stop is not None and obj["Key"] >= stop:
+                return keys
+            keys.append(obj["Key"])
+    return keys
+
+
+def list_keys(
+    s3_client: "S3Client",
+    bucket_name: str,
+    prefix: str = "",
+    partitions: str | None = None,
+) -> list[str]:
+    """
+    List object keys under a prefix, optionally in parallel.
+
+    Parameters
+    ----------
+    s3_client : S3Client
+        Initialized boto3 S3 client
+    bucket_name : str
+        Name of the S3 bucket
+    prefix : str, optional
+        Only list keys starting with this prefix, by default ""
+    partitions : str | None, optional
+        Characters that most key names directly under the prefix start
+        with, e.g. "0123456789" for PMID-named files. Each character is
+        listed as its own sub-prefix on a separate thread. By default
+        None, which lists the prefix with a single paginator.
+
+    Returns
+    -------
+    list[str]
+        Object keys under the prefix, in no particular order
+
+    Notes
+    -----
+    Keys outside the partitions, such as those in a subdirectory, are
+    still returned. They are found by listing the gaps before, between and
+    after the partitions, each starting after the last key of the
+    partition before it.
+    """
+    if not partitions:
+        return _list_prefix(s3_client, bucket_name, prefix)
+
+    bounds = sorted(set(partitions))
+
+    def list_partition(i: int) -> list[str]:
+        keys = _list_prefix(s3_client, bucket_name, prefix + bounds[i])
+        nxt = bounds[i + 1] if i + 1 < len(bounds) else None
+        # No key can fall between partitions for consecutive characters
+        if nxt is None or ord(nxt) != ord(bounds[i]) + 1:
+            keys += _list_prefix(
+                s3_client,
+                bucket_name,
+                prefix,
+                start_after=keys[-1] if keys else prefix + bounds[i],
+                stop=None if nxt is None else prefix + nxt,
+            )
+        return keys
+
+    with ThreadPoolExecutor(max_workers=len(bounds) + 1) as executor:
+        head = executor.submit(
+            _list_prefix,
+            s3_client,
+            bucket_name,
+            prefix,
+            stop=prefix + bounds[0],
+        )
+        results = list(executor.map(list_partition, range(len(bounds))))
+        return head.result() + [key for keys in results for key in keys]
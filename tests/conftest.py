@@ -0,0 +1,28 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+from s3_utils import get_s3_client
+
+BUCKET = "test-bucket"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """Mocked S3 with an empty bucket, and a fresh shared client"""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    # get_s3_client caches its client, which must be created inside the mock
+    get_s3_client.cache_clear()
+    with mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+    get_s3_client.cache_clear()
+
+
+@pytest.fixture
+def bucket(s3):
+    """Name of the empty bucket in the mocked S3"""
+    return BUCKET
@@ -0,0 +1,41 @@
+from aws_download import create_transfer, parallel_download, resolve_s3_keys
+from s3_utils import get_s3_client
+
+
+def _manifest(*pmids):
+    return [
+        {
+            "s3_key": f"pdfs/{pmid}.pdf",
+            "local_name": f"{pmid[:3]}/{pmid}.pdf",
+            "pmid": pmid,
+        }
+        for pmid in pmids
+    ]
+
+
+def test_resolve_s3_keys(s3, bucket):
+    s3.put_object(Bucket=bucket, Key="pdfs/12345.pdf", Body=b"%PDF-1")
+    s3.put_object(Bucket=bucket, Key="pdfs//67890.pdf", Body=b"%PDF-12")
+
+    resolved = resolve_s3_keys(
+        _manifest("12345", "67890", "11111"), bucket, get_s3_client()
+    )
+
+    assert [(f["s3_key"], f["size"]) for f in resolved] == [
+        ("pdfs/12345.pdf", 6),
+        ("pdfs//67890.pdf", 7),
+    ]
+
+
+def test_parallel_download(s3, bucket, tmp_path):
+    s3.put_object(Bucket=bucket, Key="pdfs/12345.pdf", Body=b"%PDF-1")
+    s3.put_object(Bucket=bucket, Key="pdfs//67890.pdf", Body=b"%PDF-12")
+
+    with create_transfer() as transfer:
+        manifest = resolve_s3_keys(
+            _manifest("12345", "67890"), bucket, get_s3_client()
+        )
+        parallel_download(manifest, bucket, str(tmp_path), transfer)
+
+    assert (tmp_path / "123" / "12345.pdf").read_bytes() == b"%PDF-1"
+    assert (tmp_path / "678" / "67890.pdf").read_bytes() == b"%PDF-12"
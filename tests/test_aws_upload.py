@@ -0,0 +1,28 @@
+from pathlib import Path
+
+from aws_upload import parse_csv_inventory
+
+
+def test_parse_csv_inventory(tmp_path, caplog):
+    csv_path = tmp_path / "inventory.csv"
+    csv_path.write_text(
+        "name\n"
+        "a/123.pdf\n"
+        "b/ 456.pdf\n"
+        "c/-5.pdf\n"
+        "d/123.pdf\n"
+        "e/12345678901234567890.pdf\n"
+        "f/abc.pdf\n"
+    )
+
+    upload_list, accessions, _ = parse_csv_inventory(str(csv_path))
+
+    assert upload_list == [
+        Path("a/123.pdf"),
+        Path("b/ 456.pdf"),
+        Path("c/-5.pdf"),
+    ]
+    assert accessions == {123, 456, -5}
+    assert "Duplicate accession number found: 123 - d/123.pdf" in caplog.text
+    assert "format: 12345678901234567890" in caplog.text
+    assert "format: abc" in caplog.text
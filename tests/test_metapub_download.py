@@ -0,0 +1,77 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import metapub_download
+
+
+def test_hung_findit_is_not_retried_or_blocking(monkeypatch):
+    calls = []
+    release = threading.Event()
+
+    def find_it(pmid):
+        calls.append(pmid)
+        if pmid == 1:
+            # Hang past the timeout, holding the only thread
+            release.wait(1)
+        return SimpleNamespace(
+            url=f"https://example.org/{pmid}",
+            backup_url="",
+            pma=None,
+            reason="",
+        )
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(metapub_download, "FindIt", find_it)
+    monkeypatch.setattr(metapub_download, "_EXECUTOR", executor)
+    monkeypatch.setattr(metapub_download, "FINDIT_TIMEOUT", 0.3)
+
+    async def lookup():
+        rate_limiter = metapub_download.TokenBucket(
+            metapub_download.REQUESTS_PER_SECOND
+        )
+        return await asyncio.gather(
+            metapub_download.get_urls(1, rate_limiter),
+            metapub_download.get_urls(2, rate_limiter),
+        )
+
+    try:
+        hung, queued = asyncio.run(lookup())
+    finally:
+        release.set()
+        executor.shutdown()
+
+    assert hung["Reason"].startswith("Timeout")
+    # PMID 2 waited for the thread, but its timeout only started once the
+    # call was running
+    assert queued["URL"] == "https://example.org/2"
+    assert calls == [1, 2]
+
+
+def test_gather_urls_counts_only_successful_rows(
+    monkeypatch, tmp_path, caplog
+):
+    def find_it(pmid):
+        if pmid == 1:
+            raise ValueError("bad PMID")
+        return SimpleNamespace(
+            url=None if pmid == 2 else f"https://example.org/{pmid}",
+            backup_url="",
+            pma=None,
+            reason="TXERROR: connection reset" if pmid == 2 else "",
+        )
+
+    monkeypatch.setattr(metapub_download, "FindIt", find_it)
+    caplog.set_level("INFO")
+
+    written = asyncio.run(
+        metapub_download.gather_urls(
+            {1, 2, 3},
+            output_path=tmp_path / "urls.csv",
+            cache_path=tmp_path / "cache.sqlite",
+        )
+    )
+
+    assert written == 3
+    assert "3 written, 1 succeeded" in caplog.text
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from s3_csv_inventory import get_s3_pmids, parse_csv_pmids, pmids_from_keys
+
+
+@pytest.mark.parametrize(
+    "prefix, expected",
+    [("", {123, 456, 789, 999}), ("/pdfs/", {123, 456, 999})],
+)
+def test_get_s3_pmids_includes_nested_keys(s3, bucket, prefix, expected):
+    keys = ["789.pdf", "pdfs/123.pdf", "pdfs/456.pdf", "pdfs/sub/999.pdf"]
+    for key in keys:
+        s3.put_object(Bucket=bucket, Key=key, Body=b"")
+
+    uri = f"s3://{bucket}{prefix}"
+    assert get_s3_pmids(uri, s3_client=s3) == expected
+
+
+def test_pmids_from_keys_rejects_overlong_stems(caplog):
+    keys = pd.Series(
+        ["pdfs/123.pdf", "pdfs/12345678901234567890.pdf", "pdfs/abc.pdf"]
+    )
+
+    assert pmids_from_keys(keys) == {123}
+    assert "filename: 12345678901234567890" in caplog.text
+    assert "filename: abc" in caplog.text
+
+
+def test_parse_csv_pmids_logs_invalid_rows(tmp_path, caplog):
+    csv_path = tmp_path / "pmids.csv"
+    csv_path.write_text("PMID\n1\n 2\n+3\n1\n12345678901234567890\nabc\n")
+
+    assert parse_csv_pmids(str(csv_path), has_header=True) == {1, 2, 3}
+    assert "Duplicate PMID 1 found in row 5" in caplog.text
+    assert "row 6: 12345678901234567890" in caplog.text
+    assert "row 7: abc" in caplog.text
@@ -0,0 +1,24 @@
+import pytest
+
+from s3_utils import list_keys
+
+KEYS = [
+    "a/-1.pdf",
+    "a/0.pdf",
+    "a/05.pdf",
+    "a/5/7.pdf",
+    "a/9z",
+    "a/:x",
+    "a/sub/999.pdf",
+    "b/1.pdf",
+]
+
+
+@pytest.mark.parametrize("partitions", [None, "0123456789", "951"])
+def test_list_keys_finds_keys_outside_partitions(s3, bucket, partitions):
+    for key in KEYS:
+        s3.put_object(Bucket=bucket, Key=key, Body=b"")
+
+    keys = list_keys(s3, bucket, "a/", partitions)
+
+    assert sorted(keys) == [key for key in KEYS if key.startswith("a/")]